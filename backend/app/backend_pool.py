@@ -0,0 +1,305 @@
+"""
+Pool of Ollama hosts shared by the summarize and image routers.
+
+OLLAMA_HOSTS lists the hosts, comma-separated; when unset the pool is the
+single OLLAMA_HOST. Every host gets its own LLMClient (connection pool,
+concurrency slots, circuit breaker) and its own health monitor, whose
+/api/tags probe is that host's model inventory.
+
+Each call goes to the host with the fewest outstanding requests (running
+plus waiting for a slot, relative to its slot count) among hosts whose
+circuit is not open and which have the model installed; ties rotate. A host
+that does not have the model loaded counts COLD_HOST_PENALTY more, so warm
+hosts are preferred until they are that much busier than a cold one. A host
+that has not been probed yet is assumed to have every model. A call that
+fails with a 503, or because the host lacks the model, is retried on the next
+best host, at most once per host. A stream is only retried if it failed
+before its first chunk, so a client never sees an answer restart.
+
+Generations without an explicit keep_alive get the traffic-based one from
+the model keeper, and every generation is sent with the model's pinned
+num_ctx (prompt_budget.num_ctx), so callers never make Ollama reload it. At
+start-up the pool loads WARMUP_MODELS on every host that has them, in the
+background, so the first requests do not pay for it.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Set, TypeVar
+
+from fastapi import HTTPException
+
+from . import metrics, prompt_budget
+from .llm_client import OLLAMA_HOST, OLLAMA_MAX_CONCURRENCY, LLMClient
+from .model_keeper import model_keeper
+from .ollama_health import OllamaHealthMonitor
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_HOSTS = [host.strip() for host in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if host.strip()]
+COLD_HOST_PENALTY = float(os.getenv("COLD_HOST_PENALTY", "1.0"))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "300"))
+
+T = TypeVar("T")
+
+
+class BackendHost:
+    def __init__(self, index: int, url: str, max_concurrency: int = OLLAMA_MAX_CONCURRENCY):
+        self.index = index
+        self.client = LLMClient(url, max_concurrency)
+        self.monitor = OllamaHealthMonitor(self.client)
+        self.capacity = max(1, max_concurrency)
+        self.requests = 0
+        self.failures = 0
+        # Calls that failed here and were retried on another host
+        self.failovers = 0
+        self.warming: Set[str] = set()
+
+    @property
+    def url(self) -> str:
+        return self.client.host
+
+    @property
+    def outstanding(self) -> int:
+        return self.client.in_flight + self.client.waiting
+
+    def load(self) -> float:
+        return self.outstanding / self.capacity
+
+    def available(self) -> bool:
+        return not self.client.breaker.is_open()
+
+    def serves(self, model: str) -> bool:
+        # Until the first successful probe the inventory is unknown; let the call find out
+        return not self.monitor.models or self.monitor.has_model(model)
+
+    def cost(self, model: str) -> float:
+        return self.load() + (0.0 if self.monitor.is_loaded(model) else COLD_HOST_PENALTY)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.monitor.snapshot(),
+            "warming": sorted(self.warming),
+            "capacity": self.capacity,
+            "outstanding": self.outstanding,
+            "utilization": round(self.client.in_flight / self.capacity, 2),
+            "requests": self.requests,
+            "failures": self.failures,
+            "failovers": self.failovers,
+        }
+
+
+def _retryable(error: HTTPException) -> bool:
+    """503s mean the host is unreachable or overloaded; a missing model may be installed elsewhere"""
+    return error.status_code == 503 or (error.status_code == 500 and "not found" in str(error.detail))
+
+
+class BackendPool:
+    def __init__(self, urls: Sequence[str] = OLLAMA_HOSTS, max_concurrency: int = OLLAMA_MAX_CONCURRENCY):
+        if not urls:
+            raise ValueError("At least one Ollama host is required")
+        self.hosts = [BackendHost(index, url, max_concurrency) for index, url in enumerate(urls)]
+        self._turn = 0
+        self._warm_up_task: Optional[asyncio.Task] = None
+
+    def choose(self, model: str, exclude: Sequence[BackendHost] = ()) -> BackendHost:
+        """The least-loaded host that can serve model now, preferring warm ones; raises if there is none"""
+        candidates = [host for host in self.hosts
+                      if host not in exclude and host.available() and host.serves(model)]
+        if not candidates:
+            raise self._unavailable(model)
+        self._turn += 1
+        return min(candidates, key=lambda host: (host.cost(model), (host.index - self._turn) % len(self.hosts)))
+
+    def ensure_available(self, model: str = None):
+        """Raise immediately, without a network call, if no host can serve model"""
+        if not any(host.available() and (model is None or host.serves(model)) for host in self.hosts):
+            raise self._unavailable(model)
+
+    def _unavailable(self, model: Optional[str]) -> HTTPException:
+        if model and any(host.available() for host in self.hosts):
+            return HTTPException(
+                status_code=500,
+                detail=f"Model '{model}' not found. Please run: ollama pull {model}"
+            )
+        where = self.hosts[0].url if len(self.hosts) == 1 else "every configured host"
+        retry_after = min(host.client.breaker.retry_after() for host in self.hosts)
+        return HTTPException(
+            status_code=503,
+            detail=f"Ollama service at {where} is unavailable. Retrying in {retry_after:.0f}s."
+        )
+
+    def _record(self, host: BackendHost, outcome: str):
+        if outcome != "ok":
+            host.failures += 1
+        metrics.observe_backend_request(host.url, outcome)
+
+    def _failover(self, host: BackendHost, model: str, tried: List[BackendHost], error: HTTPException) -> BackendHost:
+        """Pick the host to retry on after error, or re-raise error if there is none"""
+        tried.append(host)
+        if not _retryable(error):
+            self._record(host, "error")
+            raise error
+        try:
+            retry_host = self.choose(model, exclude=tried)
+        except HTTPException:
+            self._record(host, "error")
+            raise error from None
+        self._record(host, "failover")
+        host.failovers += 1
+        logger.warning(f"Ollama call to {host.url} failed ({error.detail}); retrying on {retry_host.url}")
+        return retry_host
+
+    async def _call(self, model: str, call: Callable[[LLMClient], Awaitable[T]]) -> T:
+        tried: List[BackendHost] = []
+        host = self.choose(model)
+        while True:
+            host.requests += 1
+            try:
+                result = await call(host.client)
+            except HTTPException as he:
+                host = self._failover(host, model, tried, he)
+                continue
+            self._record(host, "ok")
+            host.monitor.mark_loaded(model)
+            return result
+
+    def _generation_kwargs(self, model: str, kwargs: dict) -> dict:
+        model_keeper.record(model)
+        if kwargs.get("keep_alive") is None:
+            kwargs["keep_alive"] = model_keeper.keep_alive(model)
+        kwargs["options"] = {"num_ctx": prompt_budget.num_ctx(model), **(kwargs.get("options") or {})}
+        return kwargs
+
+    async def generate(self, model: str, prompt: str, **kwargs) -> dict:
+        """LLMClient.generate on the least-loaded host that has model"""
+        kwargs = self._generation_kwargs(model, kwargs)
+        data = await self._call(model, lambda client: client.generate(model, prompt, **kwargs))
+        model_keeper.observe_load(model, data.get("load_duration"))
+        return data
+
+    async def embeddings(self, model: str, prompt: str, **kwargs) -> List[float]:
+        """LLMClient.embeddings on the least-loaded host that has model"""
+        return await self._call(model, lambda client: client.embeddings(model, prompt, **kwargs))
+
+    async def generate_stream(self, model: str, prompt: str, **kwargs) -> AsyncIterator[dict]:
+        """LLMClient.generate_stream on the least-loaded host that has model"""
+        kwargs = self._generation_kwargs(model, kwargs)
+        tried: List[BackendHost] = []
+        host = self.choose(model)
+        while True:
+            host.requests += 1
+            started = False
+            try:
+                async for chunk in host.client.generate_stream(model, prompt, **kwargs):
+                    if not started:
+                        started = True
+                        model_keeper.observe_load(model, chunk.get("load_duration"))
+                    yield chunk
+            except HTTPException as he:
+                if started:
+                    self._record(host, "error")
+                    raise
+                host = self._failover(host, model, tried, he)
+                continue
+            self._record(host, "ok")
+            host.monitor.mark_loaded(model)
+            return
+
+    async def warm_up(self, models: Sequence[str]):
+        """Load models on every host that has them; hosts in parallel, one model at a time per host"""
+        await asyncio.gather(*(self._warm_host(host, models) for host in self.hosts))
+
+    async def _warm_host(self, host: BackendHost, models: Sequence[str]):
+        if host.monitor.last_checked is None:
+            await host.monitor.probe()
+        for model in models:
+            if not host.available() or not host.serves(model) or host.monitor.is_loaded(model):
+                continue
+            host.warming.add(model)
+            started = time.perf_counter()
+            try:
+                data = await host.client.load(model, options={"num_ctx": prompt_budget.num_ctx(model)},
+                                              keep_alive=model_keeper.keep_alive(model), timeout=WARMUP_TIMEOUT)
+            except HTTPException as he:
+                logger.warning(f"Could not warm up {model} on {host.url}: {he.detail}")
+                continue
+            finally:
+                host.warming.discard(model)
+            host.monitor.mark_loaded(model)
+            model_keeper.observe_load(model, data.get("load_duration"))
+            metrics.observe_model_load(model, data.get("load_duration"))
+            logger.info(f"Warmed up {model} on {host.url} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def start_warm_up(self, models: Sequence[str]):
+        """Warm up in the background, so start-up does not wait for model loads"""
+        if models and self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(self.warm_up(models))
+
+    def model_status(self, model: str) -> dict:
+        """Whether model is resident on a host that can take calls, for the UI's latency warning"""
+        hosts = [host for host in self.hosts if host.available() and host.serves(model)]
+        return {
+            "model": model,
+            "resident": any(host.monitor.is_loaded(model) for host in hosts),
+            "warming": any(model in host.warming for host in hosts),
+            "residentHosts": [host.url for host in hosts if host.monitor.is_loaded(model)],
+            "keepAliveSeconds": model_keeper.keep_alive_seconds(model),
+            "recentRequests": model_keeper.recent_requests(model),
+            "expectedLoadMs": model_keeper.expected_load_ms(model),
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return sum(host.client.in_flight for host in self.hosts)
+
+    @property
+    def waiting(self) -> int:
+        return sum(host.client.waiting for host in self.hosts)
+
+    async def start(self):
+        for host in self.hosts:
+            await host.monitor.start()
+
+    async def stop(self):
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+            self._warm_up_task = None
+        for host in self.hosts:
+            await host.monitor.stop()
+
+    async def aclose(self):
+        for host in self.hosts:
+            await host.client.aclose()
+
+    def snapshot(self) -> dict:
+        statuses = {host.monitor.status for host in self.hosts}
+        if statuses == {"healthy"}:
+            status = "healthy"
+        elif "healthy" in statuses:
+            status = "degraded"
+        else:
+            status = "unknown" if statuses == {"unknown"} else "unhealthy"
+        capacity = sum(host.capacity for host in self.hosts)
+        return {
+            "status": status,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "capacity": capacity,
+            "utilization": round(self.in_flight / capacity, 2),
+            "hosts": [host.snapshot() for host in self.hosts],
+        }
+
+
+backend_pool = BackendPool()
+metrics.track_queue("llm", depth=lambda: backend_pool.waiting, in_flight=lambda: backend_pool.in_flight)
+for _host in backend_pool.hosts:
+    metrics.track_backend(_host.url, in_flight=lambda host=_host: host.client.in_flight,
+                          waiting=lambda host=_host: host.client.waiting,
+                          up=lambda host=_host: float(host.monitor.status == "healthy"))
+
+
+async def close_backend_pool():
+    await backend_pool.aclose()
@@ -0,0 +1,74 @@
+"""
+Circuit breaker for calls to an Ollama host.
+
+closed:    calls flow normally; consecutive failures are counted.
+open:      after CIRCUIT_FAILURE_THRESHOLD failures, calls fail fast with 503
+           for CIRCUIT_RESET_TIMEOUT seconds.
+half_open: after the timeout one trial call is let through; success closes
+           the circuit, failure opens it again.
+"""
+import os
+import time
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_started_at = None
+
+    def allow(self) -> bool:
+        """Return True if a call may go through now"""
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+            self._trial_started_at = None
+        # Half-open: one trial at a time; a trial that never reported back is abandoned after the timeout
+        if self._trial_started_at is not None and now - self._trial_started_at < self.reset_timeout:
+            return False
+        self._trial_started_at = now
+        return True
+
+    def is_open(self) -> bool:
+        """Read-only check: True while calls are being rejected outright"""
+        return self.state == OPEN and self.retry_after() > 0
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._trial_started_at = None
+
+    def retry_after(self) -> float:
+        """Seconds until the next half-open trial, 0 when calls are allowed"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_after_seconds": round(self.retry_after(), 1),
+        }
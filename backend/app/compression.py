@@ -0,0 +1,196 @@
+"""
+Extractive pre-compression of documents before summarization.
+
+Two passes shrink the text the LLM has to read:
+
+1. Boilerplate removal: lines that recur on many pages (running headers,
+   footers, page numbers, disclaimers) are dropped. Pages are delimited by
+   the form feed that pdf_extraction places between them; digits are masked
+   so "Page 3 of 40" matches "Page 4 of 40".
+2. Sentence ranking: sentences are scored with TextRank over TF-IDF cosine
+   similarity, computed with NumPy matrix operations, and the highest scoring
+   ones are kept, in document order, until the target share of characters is
+   reached. Ranking runs over blocks of COMPRESSION_BLOCK_SENTENCES, which
+   bounds the similarity matrix and keeps coverage across the whole document.
+
+Prefill time on CPU-bound Ollama nodes grows with prompt tokens, so every
+token removed here is saved in the map, reduce and final calls alike.
+"""
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import List, NamedTuple
+
+import numpy as np
+
+from .extractors import PAGE_BREAK
+from .prompt_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Fraction of characters to keep; 1.0 disables the stage
+DEFAULT_COMPRESSION_RATIO = float(os.getenv("SUMMARY_COMPRESSION_RATIO", "1.0"))
+MIN_COMPRESSION_RATIO = 0.1
+COMPRESSION_MIN_SENTENCES = int(os.getenv("COMPRESSION_MIN_SENTENCES", "20"))
+COMPRESSION_BLOCK_SENTENCES = int(os.getenv("COMPRESSION_BLOCK_SENTENCES", "1500"))
+COMPRESSION_HASH_DIM = int(os.getenv("COMPRESSION_HASH_DIM", "4096"))
+# A line counts as boilerplate when it appears on at least this share of pages
+BOILERPLATE_PAGE_SHARE = float(os.getenv("BOILERPLATE_PAGE_SHARE", "0.5"))
+BOILERPLATE_MIN_PAGES = 3
+
+DAMPING = 0.85
+PAGERANK_ITERATIONS = 50
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_DIGITS = re.compile(r"\d+")
+
+
+class CompressionResult(NamedTuple):
+    text: str
+    original_tokens: int
+    compressed_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.compressed_tokens
+
+
+class CompressionStats:
+    def __init__(self):
+        self.documents = 0
+        self.original_tokens = 0
+        self.compressed_tokens = 0
+
+    def record(self, result: CompressionResult):
+        self.documents += 1
+        self.original_tokens += result.original_tokens
+        self.compressed_tokens += result.compressed_tokens
+
+    def snapshot(self) -> dict:
+        saved = self.original_tokens - self.compressed_tokens
+        return {
+            "documents": self.documents,
+            "original_tokens": self.original_tokens,
+            "compressed_tokens": self.compressed_tokens,
+            "tokens_saved": saved,
+            "saved_ratio": round(saved / self.original_tokens, 4) if self.original_tokens else 0.0,
+        }
+
+
+compression_stats = CompressionStats()
+
+
+def parse_ratio(value) -> float:
+    """Validate a compressionRatio setting, falling back to the configured default"""
+    if value in (None, ""):
+        return DEFAULT_COMPRESSION_RATIO
+    try:
+        ratio = float(value)
+    except (TypeError, ValueError):
+        logger.warning(f"Ignoring invalid compressionRatio: {value!r}")
+        return DEFAULT_COMPRESSION_RATIO
+    return min(1.0, max(MIN_COMPRESSION_RATIO, ratio))
+
+
+def remove_repeated_lines(text: str) -> str:
+    """Drop lines that repeat across many pages; text without page breaks is returned unchanged"""
+    pages = text.split(PAGE_BREAK)
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return text
+
+    def normalize(line: str) -> str:
+        return _DIGITS.sub("#", line.strip().lower())
+
+    page_counts = Counter()
+    for page in pages:
+        page_counts.update({normalize(line) for line in page.splitlines() if line.strip()})
+    threshold = max(BOILERPLATE_MIN_PAGES, math.ceil(len(pages) * BOILERPLATE_PAGE_SHARE))
+    boilerplate = {line for line, pages_seen in page_counts.items() if pages_seen >= threshold}
+    if not boilerplate:
+        return text
+
+    logger.info(f"Removing {len(boilerplate)} boilerplate line(s) repeated across {len(pages)} pages")
+    return f"\n{PAGE_BREAK}".join(
+        "\n".join(line for line in page.splitlines() if normalize(line) not in boilerplate)
+        for page in pages
+    )
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            sentences.extend(s for s in _SENTENCE_END.split(line) if s.strip())
+    return sentences
+
+
+def _term_matrix(sentences: List[str]) -> np.ndarray:
+    """L2-normalized TF-IDF rows, with terms hashed into COMPRESSION_HASH_DIM columns"""
+    vocabulary = {}
+    rows, cols = [], []
+    for row, sentence in enumerate(sentences):
+        for word in _WORD.findall(sentence.lower()):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)) % COMPRESSION_HASH_DIM)
+
+    tf = np.zeros((len(sentences), COMPRESSION_HASH_DIM), dtype=np.float32)
+    np.add.at(tf, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1.0)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log((1 + len(sentences)) / (1 + df)).astype(np.float32) + 1.0
+    tfidf = np.log1p(tf) * idf
+    norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+    return tfidf / np.where(norms == 0, 1.0, norms)
+
+
+def textrank_scores(sentences: List[str]) -> np.ndarray:
+    """PageRank over the sentence cosine-similarity graph"""
+    matrix = _term_matrix(sentences)
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0.0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    # Sentences with no shared terms link uniformly, so the walk stays stochastic
+    n = len(sentences)
+    transition = np.where(out_weight > 0, similarity / np.where(out_weight == 0, 1.0, out_weight), 1.0 / n)
+
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(PAGERANK_ITERATIONS):
+        updated = (1 - DAMPING) / n + DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated
+        scores = updated
+    return scores
+
+
+def _select(sentences: List[str], ratio: float) -> List[str]:
+    """Keep the best-scoring sentences of one block, in order, up to ratio of its characters"""
+    scores = textrank_scores(sentences)
+    lengths = np.fromiter((len(s) for s in sentences), dtype=np.int64, count=len(sentences))
+    order = np.argsort(-scores, kind="stable")
+    within_budget = np.cumsum(lengths[order]) <= ratio * lengths.sum()
+    # Always keep the top sentence, even if it alone exceeds the budget
+    within_budget[0] = True
+    keep = np.sort(order[within_budget])
+    return [sentences[i] for i in keep]
+
+
+def compress_text(text: str, ratio: float) -> CompressionResult:
+    """Remove boilerplate, then keep only the highest ranked sentences up to ratio of the characters"""
+    original_tokens = count_tokens(text)
+    compressed = remove_repeated_lines(text)
+
+    sentences = split_sentences(compressed)
+    if len(sentences) >= COMPRESSION_MIN_SENTENCES:
+        kept = []
+        for start in range(0, len(sentences), COMPRESSION_BLOCK_SENTENCES):
+            kept.extend(_select(sentences[start:start + COMPRESSION_BLOCK_SENTENCES], ratio))
+        compressed = "\n".join(kept)
+
+    result = CompressionResult(compressed, original_tokens, count_tokens(compressed))
+    compression_stats.record(result)
+    logger.info(f"Compression: {result.original_tokens} -> {result.compressed_tokens} tokens "
+                f"({result.tokens_saved} saved, ratio {ratio})")
+    return result
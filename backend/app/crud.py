@@ -1,7 +1,13 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
 from passlib.context import CryptContext
-from . import models, schemas
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+from . import models, schemas, search
+import base64
 import hashlib
+import json
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -60,31 +66,278 @@ def verify_offline_pin(db: Session, email: str, pin: str):
         return user
     return None
 
+def summary_row(user_id: int, file_name: str, original_text: str, summary_text: str,
+                length: str, style: str, user_prompt: str = None) -> dict:
+    """Column values for one summaries row"""
+    return {
+        "user_id": user_id,
+        "file_name": file_name,
+        "original_text": original_text[:5000],  # Store first 5000 chars
+        "summary_text": summary_text,
+        "summary_length": length,
+        "summary_style": style,
+        "user_prompt": user_prompt,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+def image_analysis_row(user_id: int, image_name: str, analysis_text: str, story_text: str = None) -> dict:
+    return {
+        "user_id": user_id,
+        "image_name": image_name,
+        "analysis_text": analysis_text,
+        "story_text": story_text,
+        "created_at": datetime.now(timezone.utc),
+    }
+
 def create_summary(db: Session, user_id: int, file_name: str, original_text: str, 
                    summary_text: str, length: str, style: str, user_prompt: str = None):
-    db_summary = models.Summary(
-        user_id=user_id,
-        file_name=file_name,
-        original_text=original_text[:5000],  # Store first 5000 chars
-        summary_text=summary_text,
-        summary_length=length,
-        summary_style=style,
-        user_prompt=user_prompt
-    )
+    db_summary = models.Summary(**summary_row(user_id, file_name, original_text, summary_text, length, style, user_prompt))
     db.add(db_summary)
+    db.flush()
+    search.index_summaries(db, [db_summary.id])
     db.commit()
-    db.refresh(db_summary)
     return db_summary
 
 def create_image_analysis(db: Session, user_id: int, image_name: str, 
                          analysis_text: str, story_text: str = None):
-    db_analysis = models.ImageAnalysis(
+    db_analysis = models.ImageAnalysis(**image_analysis_row(user_id, image_name, analysis_text, story_text))
+    db.add(db_analysis)
+    db.flush()
+    search.index_image_analyses(db, [db_analysis.id])
+    db.commit()
+    return db_analysis
+
+async def bulk_create_summaries_async(db: AsyncSession, rows: List[dict]) -> int:
+    """Insert many summary rows with one multi-row INSERT and one commit"""
+    ids = (await db.execute(insert(models.Summary).returning(models.Summary.id), rows)).scalars().all()
+    await db.run_sync(search.index_summaries, ids)
+    await db.commit()
+    return len(ids)
+
+async def bulk_create_image_analyses_async(db: AsyncSession, rows: List[dict]) -> int:
+    ids = (await db.execute(insert(models.ImageAnalysis).returning(models.ImageAnalysis.id), rows)).scalars().all()
+    await db.run_sync(search.index_image_analyses, ids)
+    await db.commit()
+    return len(ids)
+
+HISTORY_PREVIEW_CHARS = 200
+
+def encode_history_cursor(created_at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+def decode_history_cursor(cursor: str):
+    """Return (created_at, id) from an opaque cursor; raises ValueError if it is malformed"""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _history_statement(model, columns, text_column, user_id: int, limit: int, cursor: str = None):
+    """
+    One newest-first page for a user, read by keyset on (user_id, created_at, id).
+    Only the listed columns and a short preview of text_column are loaded.
+    Selects one extra row to tell whether another page follows.
+    """
+    statement = (
+        select(model, func.substr(text_column, 1, HISTORY_PREVIEW_CHARS).label("preview"))
+        .options(load_only(*columns))
+        .where(model.user_id == user_id)
+    )
+    if cursor:
+        created_at, last_id = decode_history_cursor(cursor)
+        statement = statement.where(tuple_(model.created_at, model.id) < tuple_(created_at, last_id))
+    return statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+def _history_page(rows, limit: int):
+    """Returns (items, next_cursor)"""
+    items = []
+    for row, preview in rows[:limit]:
+        row.preview = preview
+        items.append(row)
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1][0]
+        next_cursor = encode_history_cursor(last.created_at, last.id)
+    return items, next_cursor
+
+def _summaries_statement(user_id: int, limit: int, cursor: str = None):
+    S = models.Summary
+    return _history_statement(
+        S, (S.id, S.file_name, S.summary_length, S.summary_style, S.user_prompt, S.created_at),
+        S.summary_text, user_id, limit, cursor
+    )
+
+def _image_analyses_statement(user_id: int, limit: int, cursor: str = None):
+    A = models.ImageAnalysis
+    return _history_statement(
+        A, (A.id, A.image_name, A.created_at), A.analysis_text, user_id, limit, cursor
+    )
+
+def _owned(model, user_id: int, row_id: int):
+    return select(model).where(model.id == row_id, model.user_id == user_id)
+
+async def list_summaries_async(db: AsyncSession, user_id: int, limit: int = 20, cursor: str = None):
+    return _history_page((await db.execute(_summaries_statement(user_id, limit, cursor))).all(), limit)
+
+async def get_summary_async(db: AsyncSession, user_id: int, summary_id: int):
+    return (await db.scalars(_owned(models.Summary, user_id, summary_id))).first()
+
+async def list_image_analyses_async(db: AsyncSession, user_id: int, limit: int = 20, cursor: str = None):
+    return _history_page((await db.execute(_image_analyses_statement(user_id, limit, cursor))).all(), limit)
+
+async def get_image_analysis_async(db: AsyncSession, user_id: int, analysis_id: int):
+    return (await db.scalars(_owned(models.ImageAnalysis, user_id, analysis_id))).first()
+
+async def get_cached_summary_async(db: AsyncSession, cache_key: str, ttl_seconds: int):
+    """Return a non-expired cache entry and mark it as recently used"""
+    entry = await db.get(models.SummaryCacheEntry, cache_key)
+    if not entry:
+        return None
+    now = datetime.utcnow()
+    if entry.created_at and entry.created_at < now - timedelta(seconds=ttl_seconds):
+        await db.delete(entry)
+        await db.commit()
+        return None
+    entry.hit_count = (entry.hit_count or 0) + 1
+    entry.last_accessed_at = now
+    await db.commit()
+    return entry
+
+def _apply_cache_entry(entry, cache_key: str, model: str, summary_text: str):
+    """Update an existing entry in place, or return a new one to add"""
+    now = datetime.utcnow()
+    if entry:
+        entry.summary_text = summary_text
+        entry.model = model
+        entry.created_at = now
+        entry.last_accessed_at = now
+        return None
+    return models.SummaryCacheEntry(
+        cache_key=cache_key,
+        model=model,
+        summary_text=summary_text,
+        hit_count=0,
+        created_at=now,
+        last_accessed_at=now
+    )
+
+async def store_cached_summary_async(db: AsyncSession, cache_key: str, model: str, summary_text: str):
+    new_entry = _apply_cache_entry(await db.get(models.SummaryCacheEntry, cache_key), cache_key, model, summary_text)
+    if new_entry:
+        db.add(new_entry)
+    await db.commit()
+
+async def evict_summary_cache_async(db: AsyncSession, ttl_seconds: int, max_entries: int) -> int:
+    """Drop expired entries, then the least recently used ones beyond max_entries"""
+    Entry = models.SummaryCacheEntry
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+    removed = (await db.execute(
+        delete(Entry).where(Entry.created_at < cutoff).execution_options(synchronize_session=False)
+    )).rowcount
+    
+    excess = await db.scalar(select(func.count()).select_from(Entry)) - max_entries
+    if excess > 0:
+        stale_keys = (await db.scalars(
+            select(Entry.cache_key).order_by(Entry.last_accessed_at.asc()).limit(excess)
+        )).all()
+        removed += (await db.execute(
+            delete(Entry).where(Entry.cache_key.in_(stale_keys)).execution_options(synchronize_session=False)
+        )).rowcount
+    await db.commit()
+    return removed
+
+def create_job(db: Session, job_id: str, kind: str, file_name: str, input_path: str,
+               params: dict, user_id: int = None, max_attempts: int = 3):
+    db_job = models.Job(
+        id=job_id,
+        kind=kind,
+        status="queued",
         user_id=user_id,
-        image_name=image_name,
-        analysis_text=analysis_text,
-        story_text=story_text
+        file_name=file_name,
+        input_path=input_path,
+        params=json.dumps(params),
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow()
+    )
+    db.add(db_job)
+    db.commit()
+    return db_job
+
+def get_job(db: Session, job_id: str):
+    return db.get(models.Job, job_id)
+
+def claim_next_job(db: Session):
+    """Atomically move the oldest runnable job from queued to running"""
+    Job = models.Job
+    now = datetime.utcnow()
+    candidates = (
+        db.query(Job.id)
+        .filter(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.run_after.asc())
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        # Conditional update so two workers can never claim the same job
+        claimed = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.status == "queued")
+            .update({"status": "running", "started_at": now, "heartbeat_at": now, "attempts": Job.attempts + 1},
+                    synchronize_session=False)
+        )
+        db.commit()
+        if claimed:
+            return db.get(Job, job_id)
+    return None
+
+def complete_job(db: Session, job_id: str, result: dict):
+    db.query(models.Job).filter(models.Job.id == job_id).update(
+        {"status": "succeeded", "result": json.dumps(result), "error": None, "finished_at": datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+
+def fail_job(db: Session, job_id: str, error: str, retry_in: float = None):
+    """Requeue the job after retry_in seconds, or mark it failed when retry_in is None"""
+    values = {"error": error}
+    if retry_in is None:
+        values.update({"status": "failed", "finished_at": datetime.utcnow()})
+    else:
+        values.update({"status": "queued", "run_after": datetime.utcnow() + timedelta(seconds=retry_in)})
+    db.query(models.Job).filter(models.Job.id == job_id).update(values, synchronize_session=False)
+    db.commit()
+
+def heartbeat_jobs(db: Session, job_ids: List[str]):
+    """Renew the lease on jobs this process is still running"""
+    if job_ids:
+        db.query(models.Job).filter(models.Job.id.in_(job_ids), models.Job.status == "running").update(
+            {"heartbeat_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+
+STALE_JOB_ERROR = "The worker stopped before finishing this job on every attempt"
+
+def requeue_stale_jobs(db: Session, stale_after_seconds: int) -> Tuple[int, List[str]]:
+    """
+    Put jobs whose worker stopped renewing their heartbeat (crashed process,
+    or a worker that lost the job) back on the queue. A job that has used all
+    its attempts is marked failed instead, so a job that takes its worker
+    down every time is not retried forever. Returns the number of jobs
+    requeued and the input paths of the jobs that failed.
+    """
+    Job = models.Job
+    now = datetime.utcnow()
+    last_seen = func.coalesce(Job.heartbeat_at, Job.started_at)
+    stale = (Job.status == "running", last_seen < now - timedelta(seconds=stale_after_seconds))
+    exhausted = db.query(Job.id, Job.input_path).filter(*stale, Job.attempts >= Job.max_attempts).all()
+    if exhausted:
+        db.query(Job).filter(Job.id.in_([job_id for job_id, _ in exhausted]), Job.status == "running").update(
+            {"status": "failed", "error": STALE_JOB_ERROR, "finished_at": now}, synchronize_session=False
+        )
+    requeued = db.query(Job).filter(*stale, Job.attempts < Job.max_attempts).update(
+        {"status": "queued", "run_after": now}, synchronize_session=False
     )
-    db.add(db_analysis)
     db.commit()
-    db.refresh(db_analysis)
-    return db_analysis
\ No newline at end of file
+    return requeued, [input_path for _, input_path in exhausted]
\ No newline at end of file
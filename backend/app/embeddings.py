@@ -0,0 +1,284 @@
+"""
+Per-document chunk embedding index for query-focused summaries.
+
+When a user asks a question about a long document, only the chunks most
+similar to the query are sent to the LLM instead of the whole text. The
+document is split into chunks of EMBEDDING_CHUNK_TOKENS, embedded once, and
+stored under EMBEDDING_INDEX_DIR as a float16 .npy matrix (read back with
+mmap) next to the chunk texts. Indexes are content-addressed by a hash of the
+text, so re-uploads and follow-up queries reuse them without re-extracting
+or re-embedding. Every use touches the index directory; every
+EMBEDDING_INDEX_EVICT_EVERY builds, indexes unused for EMBEDDING_INDEX_TTL
+seconds are deleted, then the least recently used ones beyond
+EMBEDDING_INDEX_MAX_DOCUMENTS, so document text does not pile up on disk.
+
+Embedders are pluggable: "hashing" is a deterministic local stand-in with no
+model to download, "ollama" calls the Ollama embeddings API with
+EMBEDDING_MODEL.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from . import prompt_budget
+from .backend_pool import backend_pool
+from .singleflight import SingleFlight
+from .summarizer import split_into_chunks
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", os.path.join(os.getcwd(), "embedding_index"))
+EMBEDDING_CHUNK_TOKENS = int(os.getenv("EMBEDDING_CHUNK_TOKENS", "400"))
+EMBEDDING_CHUNK_OVERLAP_TOKENS = int(os.getenv("EMBEDDING_CHUNK_OVERLAP_TOKENS", "40"))
+EMBEDDING_TOP_K = int(os.getenv("EMBEDDING_TOP_K", "8"))
+EMBEDDING_INDEX_CACHE = int(os.getenv("EMBEDDING_INDEX_CACHE", "32"))
+EMBEDDING_INDEX_TTL = int(os.getenv("EMBEDDING_INDEX_TTL", str(7 * 24 * 3600)))
+EMBEDDING_INDEX_MAX_DOCUMENTS = int(os.getenv("EMBEDDING_INDEX_MAX_DOCUMENTS", "1000"))
+EMBEDDING_INDEX_EVICT_EVERY = int(os.getenv("EMBEDDING_INDEX_EVICT_EVERY", "20"))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_DOCUMENT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and word bigrams; deterministic and dependency-free"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _embed_one(self, text: str, out: np.ndarray):
+        words = _WORD.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = zlib.crc32(feature.encode("utf-8"))
+            out[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+
+    def _embed_sync(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            self._embed_one(text, vectors[row])
+        return _normalize(vectors)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await run_in_threadpool(self._embed_sync, texts)
+
+
+class OllamaEmbedder:
+    """Embeddings from a local Ollama embedding model"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL, concurrency: int = EMBEDDING_CONCURRENCY):
+        self.model = model
+        self.name = f"ollama-{model.replace(':', '-').replace('/', '-')}"
+        self.concurrency = concurrency
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def embed_one(text: str) -> List[float]:
+            async with semaphore:
+                return await backend_pool.embeddings(self.model, text)
+
+        vectors = await asyncio.gather(*(embed_one(text) for text in texts))
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+EMBEDDERS = {"hashing": HashingEmbedder, "ollama": OllamaEmbedder}
+
+
+def get_embedder():
+    if EMBEDDING_BACKEND not in EMBEDDERS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}'. Use one of: {', '.join(EMBEDDERS)}")
+    return EMBEDDERS[EMBEDDING_BACKEND]()
+
+
+class DocumentIndex:
+    """Chunk texts plus a memory-mapped matrix of their unit-length embeddings"""
+
+    def __init__(self, document_id: str, chunks: List[str], vectors: np.ndarray):
+        self.document_id = document_id
+        self.chunks = chunks
+        self.vectors = vectors
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Indices and cosine scores of the k most similar chunks, best first"""
+        scores = np.asarray(self.vectors @ query_vector.astype(self.vectors.dtype), dtype=np.float32)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+def document_id_for(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()[:32]
+
+
+class EmbeddingIndexStore:
+    def __init__(self, root: str = EMBEDDING_INDEX_DIR, embedder=None, cache_entries: int = EMBEDDING_INDEX_CACHE,
+                 ttl_seconds: int = EMBEDDING_INDEX_TTL, max_documents: int = EMBEDDING_INDEX_MAX_DOCUMENTS):
+        self.embedder = embedder or get_embedder()
+        self.root = os.path.join(root, self.embedder.name)
+        self.cache_entries = cache_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_documents = max_documents
+        self._loaded = OrderedDict()  # document_id -> DocumentIndex
+        self._builds = SingleFlight("embedding-index")
+        self._builds_since_evict = 0
+        self.evictions = 0
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.root, document_id)
+
+    def _load_sync(self, document_id: str) -> Optional[DocumentIndex]:
+        path = self._path(document_id)
+        if not os.path.isdir(path):
+            return None
+        with open(os.path.join(path, "chunks.json"), encoding="utf-8") as handle:
+            chunks = json.load(handle)
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        return DocumentIndex(document_id, chunks, vectors)
+
+    def _save_sync(self, index: DocumentIndex):
+        os.makedirs(self.root, exist_ok=True)
+        # Write into a temporary directory and rename, so readers never see half an index
+        staging = tempfile.mkdtemp(dir=self.root, prefix=".build-")
+        try:
+            np.save(os.path.join(staging, "vectors.npy"), index.vectors.astype(np.float16))
+            with open(os.path.join(staging, "chunks.json"), "w", encoding="utf-8") as handle:
+                json.dump(index.chunks, handle)
+            os.replace(staging, self._path(index.document_id))
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(self._path(index.document_id)):
+                raise
+
+    def _touch(self, document_id: str):
+        # The directory's mtime is its last use, for eviction
+        try:
+            os.utime(self._path(document_id))
+        except OSError:
+            pass
+
+    def _evict_sync(self) -> List[str]:
+        """Delete indexes unused for ttl_seconds, then the least recently used beyond max_documents"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        now = time.time()
+        entries = []
+        for name in names:
+            try:
+                entries.append((os.stat(os.path.join(self.root, name)).st_mtime, name))
+            except OSError:
+                continue
+        entries.sort(reverse=True)
+        expired = [name for mtime, name in entries if now - mtime > self.ttl_seconds]
+        kept = [name for mtime, name in entries if now - mtime <= self.ttl_seconds and _DOCUMENT_ID.match(name)]
+        removed = expired + kept[self.max_documents:]
+        for name in removed:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        return removed
+
+    async def evict(self) -> int:
+        removed = await run_in_threadpool(self._evict_sync)
+        for document_id in removed:
+            self._loaded.pop(document_id, None)
+        if removed:
+            self.evictions += len(removed)
+            logger.info(f"Evicted {len(removed)} embedding index(es)")
+        return len(removed)
+
+    def _remember(self, index: DocumentIndex) -> DocumentIndex:
+        self._touch(index.document_id)
+        self._loaded[index.document_id] = index
+        self._loaded.move_to_end(index.document_id)
+        while len(self._loaded) > self.cache_entries:
+            self._loaded.popitem(last=False)
+        return index
+
+    async def load(self, document_id: str) -> DocumentIndex:
+        """Open an existing index, 404 if this document was never indexed"""
+        if not _DOCUMENT_ID.match(document_id or ""):
+            raise HTTPException(status_code=400, detail="Invalid documentId")
+        if document_id in self._loaded:
+            self._loaded.move_to_end(document_id)
+            self._touch(document_id)
+            return self._loaded[document_id]
+        index = await run_in_threadpool(self._load_sync, document_id)
+        if index is None:
+            raise HTTPException(status_code=404, detail="Document index not found. Upload the document again.")
+        return self._remember(index)
+
+    def has(self, document_id: str) -> bool:
+        """Whether this replica can serve follow-up queries on the document without re-embedding it"""
+        return document_id in self._loaded or os.path.isdir(self._path(document_id))
+
+    async def get_or_build(self, text: str) -> DocumentIndex:
+        """Return the index for this text, embedding its chunks only the first time"""
+        document_id = document_id_for(text)
+        if document_id in self._loaded:
+            return await self.load(document_id)
+
+        async def build() -> DocumentIndex:
+            index = await run_in_threadpool(self._load_sync, document_id)
+            if index is not None:
+                return self._remember(index)
+            chunks = split_into_chunks(
+                text,
+                prompt_budget.tokens_to_chars(EMBEDDING_CHUNK_TOKENS, text),
+                prompt_budget.tokens_to_chars(EMBEDDING_CHUNK_OVERLAP_TOKENS, text)
+            )
+            logger.info(f"Embedding {len(chunks)} chunks for document {document_id} with {self.embedder.name}")
+            vectors = await self.embedder.embed(chunks)
+            index = DocumentIndex(document_id, chunks, vectors)
+            await run_in_threadpool(self._save_sync, index)
+            index = self._remember(await run_in_threadpool(self._load_sync, document_id))
+            self._builds_since_evict += 1
+            if self._builds_since_evict >= EMBEDDING_INDEX_EVICT_EVERY:
+                self._builds_since_evict = 0
+                await self.evict()
+            return index
+
+        return await self._builds.do(document_id, build)
+
+    async def relevant_text(self, index: DocumentIndex, query: str, max_tokens: int,
+                            top_k: int = EMBEDDING_TOP_K) -> str:
+        """The top-k chunks for the query that fit in max_tokens, joined in document order"""
+        query_vector = (await self.embedder.embed([query]))[0]
+        selected = []
+        used = 0
+        for position, score in index.search(query_vector, top_k):
+            tokens = prompt_budget.count_tokens(index.chunks[position])
+            if selected and used + tokens > max_tokens:
+                break
+            selected.append(position)
+            used += tokens
+        logger.info(f"Query-focused context: {len(selected)}/{len(index.chunks)} chunks, {used} tokens")
+        return "\n\n".join(index.chunks[i] for i in sorted(selected))
+
+
+index_store = EmbeddingIndexStore()
@@ -0,0 +1,85 @@
+"""
+Registry of text extractors, keyed by file extension.
+
+Each entry names the module and function that parse one format. The module
+is imported the first time a file of that type arrives, so parser libraries
+(PyPDF2, mammoth, openpyxl) stay out of application start-up and a worker
+that never sees a PDF never loads PyPDF2. Formats register an optional
+shutdown function, called from the lifespan only if the module was loaded.
+"""
+import importlib
+import logging
+import os
+import threading
+from typing import BinaryIO, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Separates pages in extracted text, so later stages can tell pages apart
+PAGE_BREAK = "\f"
+
+
+class Extractor:
+    def __init__(self, extension: str, label: str, module: str, function: str, shutdown: Optional[str] = None):
+        self.extension = extension
+        self.label = label
+        self.module = module
+        self.function = function
+        self.shutdown_function = shutdown
+        self._extract: Optional[Callable[[BinaryIO], str]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._extract is not None
+
+    def load(self) -> Callable[[BinaryIO], str]:
+        if self._extract is None:
+            module = importlib.import_module(self.module, package=__package__)
+            self._extract = getattr(module, self.function)
+            logger.info(f"Loaded {self.label} extractor from {module.__name__}")
+        return self._extract
+
+    def extract(self, fileobj: BinaryIO) -> str:
+        return self.load()(fileobj)
+
+    def shutdown(self):
+        if self.loaded and self.shutdown_function:
+            module = importlib.import_module(self.module, package=__package__)
+            getattr(module, self.shutdown_function)()
+
+
+class ExtractorRegistry:
+    def __init__(self):
+        self._extractors: Dict[str, Extractor] = {}
+        # Extraction runs in the threadpool; the first load of a format must happen once
+        self._lock = threading.Lock()
+
+    def register(self, extension: str, label: str, module: str, function: str, shutdown: Optional[str] = None):
+        self._extractors[extension.lower()] = Extractor(extension.lower(), label, module, function, shutdown)
+
+    def get(self, filename: str) -> Optional[Extractor]:
+        extractor = self._extractors.get(os.path.splitext(filename.lower())[1])
+        if extractor is not None and not extractor.loaded:
+            with self._lock:
+                extractor.load()
+        return extractor
+
+    def extensions(self) -> List[str]:
+        return sorted(self._extractors)
+
+    def shutdown(self):
+        for extractor in self._extractors.values():
+            extractor.shutdown()
+
+
+registry = ExtractorRegistry()
+registry.register(".txt", "TXT", ".ingestion", "read_text_file")
+registry.register(".pdf", "PDF", ".pdf_extraction", "extract_pdf_text", shutdown="shutdown_pool")
+registry.register(".docx", "DOCX", ".ingestion", "extract_docx_text")
+registry.register(".doc", "DOC", ".ingestion", "extract_doc_text")
+registry.register(".xlsx", "XLSX", ".ingestion", "extract_xlsx_text")
+
+
+def shutdown_extractors():
+    """Release resources held by loaded extractors, such as the PDF worker pool"""
+    registry.shutdown()
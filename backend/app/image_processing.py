@@ -0,0 +1,131 @@
+"""
+Image preprocessing before LLaVA calls.
+
+Uploads are decoded once (JPEGs at reduced scale via Image.draft), rotated
+according to their EXIF orientation, downscaled to the vision model's input
+resolution and re-encoded as a compact JPEG, so 12 MP phone photos are not
+base64-shipped to the model as-is. A 64-bit difference hash (dHash) of the
+normalized image lets re-uploads and near-identical images reuse an earlier
+analysis from ImageAnalysisCache.
+"""
+import base64
+import logging
+import os
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "672"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+IMAGE_CACHE_ENTRIES = int(os.getenv("IMAGE_CACHE_ENTRIES", "512"))
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", str(24 * 3600)))
+# Max differing bits (out of 64) for two images to count as the same picture
+IMAGE_HASH_DISTANCE = int(os.getenv("IMAGE_HASH_DISTANCE", "4"))
+
+
+class PreparedImage(NamedTuple):
+    base64: str
+    phash: int
+    width: int
+    height: int
+    original_bytes: int
+    encoded_bytes: int
+
+
+def difference_hash(img: Image.Image, size: int = 8) -> int:
+    """64-bit dHash: compares brightness of horizontally adjacent pixels on a 9x8 thumbnail"""
+    small = img.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def preprocess_image(image_data: bytes, max_side: int = VISION_MAX_SIDE) -> PreparedImage:
+    """Normalize orientation, downscale to the model's input size and re-encode as JPEG"""
+    try:
+        with Image.open(BytesIO(image_data)) as img:
+            # JPEG only: decode at a reduced DCT scale, far cheaper than full-size decode + resize
+            img.draft("RGB", (max_side, max_side))
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+            phash = difference_hash(img)
+            out = BytesIO()
+            img.save(out, "JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+            width, height = img.size
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning(f"Could not decode image: {str(e)}")
+        raise HTTPException(status_code=400, detail="Unsupported or corrupt image file")
+
+    encoded = out.getvalue()
+    logger.info(f"Preprocessed image: {len(image_data)} -> {len(encoded)} bytes, {width}x{height}")
+    return PreparedImage(
+        base64=base64.b64encode(encoded).decode("utf-8"),
+        phash=phash,
+        width=width,
+        height=height,
+        original_bytes=len(image_data),
+        encoded_bytes=len(encoded),
+    )
+
+
+class ImageAnalysisCache:
+    """LRU of analysis results keyed by settings and perceptual hash, matched within a Hamming distance"""
+
+    def __init__(self, max_entries: int = IMAGE_CACHE_ENTRIES, ttl_seconds: int = IMAGE_CACHE_TTL,
+                 max_distance: int = IMAGE_HASH_DISTANCE):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # (settings_key, phash) -> (stored_at, result)
+        self.counters = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0}
+
+    def get(self, settings_key: str, phash: int) -> Optional[Tuple]:
+        now = time.monotonic()
+        key = (settings_key, phash)
+        item = self._entries.get(key)
+        if item and now - item[0] <= self.ttl_seconds:
+            self._entries.move_to_end(key)
+            self.counters["exact_hits"] += 1
+            return item[1]
+
+        # Near-duplicates: linear scan is fine for a few hundred 64-bit ints
+        for (cached_settings, cached_hash), (stored_at, result) in reversed(self._entries.items()):
+            if (cached_settings == settings_key and now - stored_at <= self.ttl_seconds
+                    and bin(cached_hash ^ phash).count("1") <= self.max_distance):
+                self._entries.move_to_end((cached_settings, cached_hash))
+                self.counters["near_hits"] += 1
+                return result
+
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, settings_key: str, phash: int, result: Tuple):
+        key = (settings_key, phash)
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        self.counters["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._entries)}
+
+
+image_cache = ImageAnalysisCache()
@@ -0,0 +1,170 @@
+"""
+Memory-bounded ingestion for TXT, DOCX, DOC and XLSX uploads.
+
+Parsers read straight from Starlette's spooled upload file instead of
+copying it into a BytesIO. Plain text is decoded from a zero-copy view of
+the spool (an mmap once it has rolled over to disk). DOCX is streamed
+paragraph by paragraph from the zip, XLSX is read in openpyxl's read_only
+mode, and every parser stops at EXTRACTION_MAX_CHARS, so an oversized
+document is truncated instead of exhausting the worker's memory. PDFs
+(pdf_extraction.py) stop at the same limit.
+mammoth and openpyxl are imported on first use rather than at start-up.
+"""
+import logging
+import mmap
+import os
+import zipfile
+from contextlib import contextmanager
+from typing import BinaryIO
+from xml.etree import ElementTree
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+# Per-document ceiling on extracted text; with BATCH_MAX_IN_FLIGHT this bounds a request's memory
+EXTRACTION_MAX_CHARS = int(os.getenv("EXTRACTION_MAX_CHARS", str(5_000_000)))
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class _TextBudget:
+    """Collect text parts until a character ceiling is reached"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.parts = []
+        self.chars = 0
+        self.truncated = False
+
+    def add(self, part: str) -> bool:
+        """Append part; returns False once the budget is exhausted"""
+        remaining = self.max_chars - self.chars
+        if len(part) > remaining:
+            part = part[:max(remaining, 0)]
+            self.truncated = True
+        self.parts.append(part)
+        self.chars += len(part)
+        return not self.truncated
+
+    def text(self, separator: str, label: str) -> str:
+        if self.truncated:
+            logger.warning(f"{label} text truncated at {self.max_chars} characters (EXTRACTION_MAX_CHARS)")
+        return separator.join(self.parts)
+
+
+def upload_size(fileobj: BinaryIO) -> int:
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def check_upload_size(fileobj: BinaryIO, filename: str):
+    size = upload_size(fileobj)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{filename} is {size // (1024 * 1024)} MB, larger than the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"
+        )
+
+
+@contextmanager
+def spool_view(fileobj: BinaryIO):
+    """
+    Yield a zero-copy buffer over a spooled upload: a memoryview of the
+    in-memory BytesIO, or an mmap of the temp file once it has rolled to disk.
+    Yields None when the object exposes neither.
+    """
+    inner = getattr(fileobj, "_file", fileobj)
+    if hasattr(inner, "getbuffer"):
+        view = inner.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+        return
+
+    try:
+        fileno = inner.fileno()
+    except (AttributeError, OSError, ValueError):
+        yield None
+        return
+
+    if os.fstat(fileno).st_size == 0:
+        yield b""
+        return
+    mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        mapped.close()
+
+
+def read_text_file(fileobj: BinaryIO, max_chars: int = EXTRACTION_MAX_CHARS) -> str:
+    # UTF-8 never needs more than 4 bytes per character
+    max_bytes = max_chars * 4
+    with spool_view(fileobj) as view:
+        if view is None:
+            fileobj.seek(0)
+            content = fileobj.read(max_bytes).decode('utf-8', errors='ignore')
+        else:
+            with memoryview(view)[:max_bytes] as data:
+                content = str(data, 'utf-8', 'ignore')
+    if len(content) > max_chars:
+        logger.warning(f"TXT text truncated at {max_chars} characters (EXTRACTION_MAX_CHARS)")
+        content = content[:max_chars]
+    return content
+
+
+def extract_docx_text(fileobj: BinaryIO, max_chars: int = EXTRACTION_MAX_CHARS) -> str:
+    """Stream paragraphs out of word/document.xml without building the full document tree"""
+    budget = _TextBudget(max_chars)
+    with zipfile.ZipFile(fileobj) as archive, archive.open("word/document.xml") as document:
+        for _, element in ElementTree.iterparse(document, events=("end",)):
+            if element.tag != f"{_W}p":
+                continue
+            runs = []
+            for node in element.iter():
+                if node.tag == f"{_W}t":
+                    runs.append(node.text or "")
+                elif node.tag == f"{_W}tab":
+                    runs.append("\t")
+                elif node.tag in (f"{_W}br", f"{_W}cr"):
+                    runs.append("\n")
+            element.clear()
+            if not budget.add("".join(runs) + "\n"):
+                break
+    return budget.text("", "DOCX").rstrip("\n")
+
+
+def extract_doc_text(fileobj: BinaryIO, max_chars: int = EXTRACTION_MAX_CHARS) -> str:
+    import mammoth
+
+    text = mammoth.extract_raw_text(fileobj).value
+    if len(text) > max_chars:
+        logger.warning(f"DOC text truncated at {max_chars} characters (EXTRACTION_MAX_CHARS)")
+        text = text[:max_chars]
+    return text
+
+
+def extract_xlsx_text(fileobj: BinaryIO, max_chars: int = EXTRACTION_MAX_CHARS) -> str:
+    """Read rows in openpyxl's streaming read_only mode"""
+    import openpyxl
+
+    budget = _TextBudget(max_chars)
+    wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            for row in ws.iter_rows(values_only=True):
+                values = [str(value) if value else "" for value in row]
+                if not budget.add(" ".join(values) + "\n"):
+                    break
+            if budget.truncated:
+                break
+    finally:
+        wb.close()
+    return budget.text("", "XLSX")
@@ -0,0 +1,180 @@
+"""
+Durable background jobs for summarization and image analysis.
+
+Submitted uploads are written to JOB_STORAGE_DIR and recorded in the jobs
+table, so work survives proxy timeouts, browser reloads and server restarts.
+A pool of JOB_WORKERS asyncio workers claims queued jobs from the database,
+runs the handler registered for the job kind, and retries failures with
+exponential backoff up to the job's max_attempts.
+
+A running job is leased: every JOB_HEARTBEAT_INTERVAL the pool renews
+heartbeat_at on the jobs it holds, and requeues jobs whose heartbeat is older
+than JOB_STALE_SECONDS (or fails them once their attempts are used). That
+recovers jobs orphaned by a crashed replica, or by a worker here that hit an
+error it could not record, without touching jobs another replica is still
+running.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from typing import Awaitable, BinaryIO, Callable, Dict, List, Optional, Set
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from . import crud, metrics, models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+JOB_STORAGE_DIR = os.getenv("JOB_STORAGE_DIR", os.path.join(os.getcwd(), "job_data"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "120"))
+
+JobHandler = Callable[[models.Job], Awaitable[dict]]
+
+
+def _with_session(fn, *args, **kwargs):
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+def store_upload(fileobj: BinaryIO, file_name: str, kind: str, params: dict, user_id: int = None) -> str:
+    """Persist an upload to disk and enqueue a job for it; returns the job id"""
+    job_id = str(uuid.uuid4())
+    job_dir = os.path.join(JOB_STORAGE_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    input_path = os.path.join(job_dir, os.path.basename(file_name) or "upload")
+    fileobj.seek(0)
+    with open(input_path, "wb") as out:
+        shutil.copyfileobj(fileobj, out)
+    _with_session(crud.create_job, job_id, kind, file_name, input_path, params,
+                  user_id=user_id, max_attempts=JOB_MAX_ATTEMPTS)
+    return job_id
+
+
+def _remove_input(input_path: str):
+    shutil.rmtree(os.path.dirname(input_path), ignore_errors=True)
+
+
+class JobWorkerPool:
+    """Local pool of asyncio workers pulling jobs from the jobs table"""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._maintenance: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._running: Set[str] = set()
+        self.active = 0
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    def notify(self):
+        """Wake idle workers after a submit instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        self._maintenance = asyncio.create_task(self._maintain())
+        logger.info(f"Started {self.workers} job worker(s)")
+
+    async def stop(self):
+        tasks = self._tasks + ([self._maintenance] if self._maintenance else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._maintenance = None
+
+    async def recover_stale_jobs(self):
+        """Renew this pool's leases, then requeue or fail jobs whose lease has expired"""
+        await run_in_threadpool(_with_session, crud.heartbeat_jobs, list(self._running))
+        requeued, failed_inputs = await run_in_threadpool(_with_session, crud.requeue_stale_jobs, JOB_STALE_SECONDS)
+        if requeued:
+            logger.info(f"Requeued {requeued} stale job(s)")
+            self.notify()
+        if failed_inputs:
+            logger.error(f"Failed {len(failed_inputs)} stale job(s) that had used all their attempts")
+        for input_path in failed_inputs:
+            _remove_input(input_path)
+
+    async def _maintain(self):
+        while True:
+            try:
+                await self.recover_stale_jobs()
+            except Exception as e:
+                logger.error(f"Could not renew job leases or recover stale jobs: {str(e)}")
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                job = await run_in_threadpool(_with_session, crud.claim_next_job)
+            except Exception as e:
+                logger.error(f"Job worker {number} could not poll the queue: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.active += 1
+            self._running.add(job.id)
+            try:
+                await self._run(job)
+            except Exception:
+                # Usually the job's outcome could not be recorded; its lease lapses and
+                # recover_stale_jobs retries or fails it, and this worker carries on
+                logger.exception(f"Job worker {number} lost job {job.id}")
+            finally:
+                self._running.discard(job.id)
+                self.active -= 1
+
+    async def _run(self, job: models.Job):
+        handler = self._handlers.get(job.kind)
+        logger.info(f"Running job {job.id} ({job.kind}, attempt {job.attempts}/{job.max_attempts})")
+        try:
+            if handler is None:
+                raise HTTPException(status_code=400, detail=f"Unknown job kind: {job.kind}")
+            result = await handler(job)
+        except asyncio.CancelledError:
+            # Shutdown mid-job: leave it running; its lease lapses and it is requeued
+            raise
+        except Exception as e:
+            # Client errors (bad file, empty document) will fail again; anything else may be transient
+            retryable = not (isinstance(e, HTTPException) and e.status_code < 500)
+            error = e.detail if isinstance(e, HTTPException) else f"Unexpected error: {str(e)}"
+            if retryable and job.attempts < job.max_attempts:
+                retry_in = JOB_RETRY_BACKOFF * (2 ** (job.attempts - 1))
+                logger.warning(f"Job {job.id} failed ({error}), retrying in {retry_in:.1f}s")
+                await run_in_threadpool(_with_session, crud.fail_job, job.id, error, retry_in)
+            else:
+                logger.error(f"Job {job.id} failed permanently: {error}")
+                await run_in_threadpool(_with_session, crud.fail_job, job.id, error)
+                _remove_input(job.input_path)
+            return
+
+        await run_in_threadpool(_with_session, crud.complete_job, job.id, result)
+        _remove_input(job.input_path)
+        logger.info(f"Job {job.id} succeeded")
+
+
+job_pool = JobWorkerPool()
+metrics.track_queue("jobs", in_flight=lambda: job_pool.active)
@@ -0,0 +1,253 @@
+"""
+Shared async client for the Ollama HTTP API.
+
+Each Ollama host is reached through one pooled httpx.AsyncClient, so LLM
+calls never block the event loop and keep-alive connections are reused
+across requests. Routers go through the backend pool, which holds one
+client per host. Errors are mapped to the same HTTPExceptions the routes
+already return to the frontend.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Awaitable, List, Optional, TypeVar
+
+import httpx
+from fastapi import HTTPException, Request
+
+from . import metrics
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "1.0"))
+
+T = TypeVar("T")
+
+
+class LLMClient:
+    """Async Ollama client backed by a pooled keep-alive HTTP connection"""
+
+    def __init__(self, host: str = OLLAMA_HOST, max_concurrency: int = OLLAMA_MAX_CONCURRENCY):
+        self.host = host.rstrip("/")
+        self._client: Optional[httpx.AsyncClient] = None
+        # Caps generations to this host across every request in this worker; extra calls queue here
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self.in_flight = 0
+        self.waiting = 0
+        self.breaker = CircuitBreaker()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.host,
+                timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+                    keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+
+    async def generate(self, model: str, prompt: str, images: List[str] = None,
+                       options: dict = None, timeout: float = None, keep_alive: str = None) -> dict:
+        """Run a non-streaming generation and return Ollama's response body"""
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if images:
+            payload["images"] = images
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+
+        self.check_circuit()
+        async with self._generation_slot():
+            started = time.perf_counter()
+            response = await self._request("POST", "/api/generate", model=model, json=payload, timeout=timeout)
+        data = response.json()
+        if not data or 'response' not in data:
+            logger.error("Ollama returned empty or invalid response")
+            raise HTTPException(status_code=500, detail="Ollama returned empty response")
+        metrics.observe_llm_call(model, "generate", time.perf_counter() - started, data)
+        return data
+
+    async def generate_stream(self, model: str, prompt: str, images: List[str] = None,
+                              options: dict = None, timeout: float = None, keep_alive: str = None) -> AsyncIterator[dict]:
+        """Run a streaming generation, yielding each NDJSON chunk as Ollama produces it"""
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        if images:
+            payload["images"] = images
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+
+        request_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        self.check_circuit()
+        async with self._generation_slot():
+            started = time.perf_counter()
+            with self._transport_errors("POST", "/api/generate"):
+                async with self.client.stream("POST", "/api/generate", json=payload, timeout=request_timeout) as response:
+                    self.breaker.record_success()
+                    if response.status_code != 200:
+                        await response.aread()
+                        raise_for_ollama_error(response, model)
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise HTTPException(status_code=500, detail=f"Ollama error: {chunk['error']}")
+                        if chunk.get("done"):
+                            # The final chunk carries the eval counters for the whole generation
+                            metrics.observe_llm_call(model, "generate_stream", time.perf_counter() - started, chunk)
+                        yield chunk
+                        if chunk.get("done"):
+                            return
+
+    async def embeddings(self, model: str, prompt: str, timeout: float = None) -> List[float]:
+        """Embed one text with an Ollama embedding model"""
+        self.check_circuit()
+        started = time.perf_counter()
+        response = await self._request("POST", "/api/embeddings", model=model,
+                                       json={"model": model, "prompt": prompt}, timeout=timeout)
+        metrics.observe_llm_call(model, "embeddings", time.perf_counter() - started)
+        embedding = response.json().get("embedding")
+        if not embedding:
+            raise HTTPException(status_code=500, detail=f"Ollama returned no embedding for model '{model}'")
+        return embedding
+
+    async def tags(self, timeout: float = OLLAMA_CONNECT_TIMEOUT) -> dict:
+        """List the models installed on the Ollama host"""
+        response = await self._request("GET", "/api/tags", timeout=timeout)
+        return response.json()
+
+    async def ps(self, timeout: float = OLLAMA_CONNECT_TIMEOUT) -> dict:
+        """List the models currently loaded in memory on the Ollama host"""
+        response = await self._request("GET", "/api/ps", timeout=timeout)
+        return response.json()
+
+    async def load(self, model: str, options: dict = None, keep_alive: str = None, timeout: float = None) -> dict:
+        """
+        Load a model into memory without generating; the body's load_duration is the load time.
+        Pass the options later generations will use: Ollama reloads the model if num_ctx differs.
+        """
+        payload = {"model": model, "stream": False}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        self.check_circuit()
+        response = await self._request("POST", "/api/generate", model=model, json=payload, timeout=timeout)
+        return response.json()
+
+    async def _request(self, method: str, path: str, model: str = None, timeout: float = None, **kwargs) -> httpx.Response:
+        request_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        with self._transport_errors(method, path):
+            response = await self.client.request(method, path, timeout=request_timeout, **kwargs)
+        self.breaker.record_success()
+
+        if response.status_code != 200:
+            raise_for_ollama_error(response, model)
+        return response
+
+    def check_circuit(self):
+        """Fail fast with 503 while the circuit for this host is open"""
+        if not self.breaker.allow():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Ollama service at {self.host} is unavailable. Retrying in {self.breaker.retry_after():.0f}s."
+            )
+
+    @asynccontextmanager
+    async def _generation_slot(self):
+        self.waiting += 1
+        queued = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        metrics.observe_queue_wait("llm", time.perf_counter() - queued)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    @contextmanager
+    def _transport_errors(self, method: str, path: str):
+        """Map httpx transport failures to the 503s the frontend already understands"""
+        try:
+            yield
+        except httpx.ConnectError:
+            self.breaker.record_failure()
+            logger.error(f"Cannot connect to Ollama at {self.host}")
+            raise HTTPException(
+                status_code=503,
+                detail=f"Cannot connect to Ollama service at {self.host}. Please ensure Ollama is running. Start it with 'ollama serve' command."
+            )
+        except httpx.TimeoutException:
+            self.breaker.record_failure()
+            logger.error(f"Ollama request timeout: {method} {path}")
+            raise HTTPException(
+                status_code=503,
+                detail="Ollama service timeout. Please check if Ollama is running properly."
+            )
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            logger.error(f"Ollama transport error: {str(e)}")
+            raise HTTPException(
+                status_code=503,
+                detail="Lost connection to Ollama service. Please check if Ollama is still running."
+            )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def raise_for_ollama_error(response: httpx.Response, model: str = None):
+    """Translate an Ollama error response into an HTTPException"""
+    try:
+        error_msg = response.json().get("error", response.text)
+    except ValueError:
+        error_msg = response.text
+    logger.error(f"Ollama returned status code {response.status_code}: {error_msg}")
+
+    if "model" in error_msg.lower() and "not found" in error_msg.lower():
+        raise HTTPException(
+            status_code=500,
+            detail=f"Model '{model}' not found. Please run: ollama pull {model}"
+        )
+    raise HTTPException(status_code=500, detail=f"Ollama error: {error_msg}")
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T],
+                               poll_interval: float = DISCONNECT_POLL_INTERVAL) -> T:
+    """Await awaitable, cancelling it (and its Ollama calls) if the HTTP client goes away"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling pending LLM work")
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
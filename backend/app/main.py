@@ -1,12 +1,48 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .database import Base, engine
-from .routes import auth, summarize, image_analysis
+from .database import close_async_engine
+from . import metrics
+from .extractors import shutdown_extractors
+from .backend_pool import backend_pool, close_backend_pool
+from .model_keeper import WARMUP_MODELS, model_keeper
+from .jobs import job_pool
+from .migrations import RUN_MIGRATIONS_ON_STARTUP, run_migrations
+from .persistence import write_behind
+from .routes import auth, summarize, image_analysis, jobs, history
+
+# Seconds spent in each start-up phase, reported by /health and /metrics
+startup_timings = {"import": time.perf_counter() - _import_started}
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Schema setup needs a database round trip; it runs here, not at import
+    if RUN_MIGRATIONS_ON_STARTUP:
+        startup_timings["migrations"] = await run_in_threadpool(run_migrations)
+    await write_behind.start()
+    await backend_pool.start()
+    # Model loads take seconds each; they run in the background instead of delaying start-up
+    backend_pool.start_warm_up(WARMUP_MODELS)
+    await job_pool.start()
+    startup_timings["lifespan"] = time.perf_counter() - started
+    for phase, seconds in startup_timings.items():
+        metrics.observe_startup(phase, seconds)
+    yield
+    await job_pool.stop()
+    # Write queued summaries and analyses before the process exits
+    await write_behind.stop()
+    await backend_pool.stop()
+    # Release pooled Ollama and database connections and PDF worker processes
+    await close_backend_pool()
+    shutdown_extractors()
+    await close_async_engine()
 
-app = FastAPI(title="DocuMind AI Backend")
+app = FastAPI(title="DocuMind AI Backend", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -21,6 +57,8 @@ app.add_middleware(
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(summarize.router, prefix="/summarize", tags=["Summarization"])
 app.include_router(image_analysis.router, prefix="/image", tags=["Image Analysis"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
+app.include_router(history.router, prefix="/history", tags=["History"])
 
 @app.get("/")
 def read_root():
@@ -28,4 +66,16 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    ollama = backend_pool.snapshot()
+    return {
+        "status": "healthy" if ollama["status"] == "healthy" else "degraded",
+        "ollama": ollama,
+        "models": [backend_pool.model_status(model) for model in model_keeper.models()],
+        "persistence": write_behind.snapshot(),
+        "startup_ms": {phase: round(seconds * 1000, 1) for phase, seconds in startup_timings.items()}
+    }
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, headers={"Content-Type": content_type})
@@ -0,0 +1,168 @@
+"""
+Prometheus metrics for the summarize and image pipelines.
+
+Stage latencies are histograms:
+- text extraction, per file type
+- other pipeline stages (compression, retrieval, summarization, image preprocessing)
+- every Ollama call, plus Ollama's own prefill/decode split and throughput
+  from eval_count / eval_duration / prompt_eval_duration
+- database writes and the Ollama health probe
+
+Start-up phases (import, migrations, lifespan) are gauges.
+
+Each Ollama host in the backend pool reports its running and waiting calls,
+whether its last health probe succeeded, how its calls ended, and which
+models it has loaded. Model load times Ollama reports are a histogram too.
+
+Queue depth and in-flight gauges call back into each scheduler's live
+counters only when /metrics is scraped, so the hot path pays for nothing
+more than a histogram observe().
+"""
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320, 640, 1280, 2560)
+
+EXTRACTION_SECONDS = Histogram(
+    "documind_extraction_seconds", "Text extraction time per file type", ["file_type"], buckets=STAGE_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "documind_stage_seconds", "Time spent in a pipeline stage", ["stage"], buckets=STAGE_BUCKETS
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "documind_llm_request_seconds", "Ollama call latency after a slot was acquired",
+    ["model", "endpoint"], buckets=LLM_BUCKETS
+)
+LLM_PHASE_SECONDS = Histogram(
+    "documind_llm_phase_seconds", "Ollama-reported prefill (prompt) and decode (eval) time",
+    ["model", "phase"], buckets=LLM_BUCKETS
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "documind_llm_tokens_per_second", "Ollama prefill (prompt) and decode (eval) throughput",
+    ["model", "phase"], buckets=THROUGHPUT_BUCKETS
+)
+LLM_TOKENS = Counter("documind_llm_tokens", "Tokens processed by Ollama", ["model", "phase"])
+QUEUE_WAIT_SECONDS = Histogram(
+    "documind_queue_wait_seconds", "Time spent waiting for a concurrency slot", ["queue"], buckets=STAGE_BUCKETS
+)
+DB_WRITE_SECONDS = Histogram(
+    "documind_db_write_seconds", "Time to write and commit one batch of rows", ["kind"], buckets=STAGE_BUCKETS
+)
+DB_WRITE_ROWS = Counter("documind_db_write_rows", "Rows written to the database", ["kind"])
+HEALTH_PROBE_SECONDS = Histogram(
+    "documind_ollama_health_probe_seconds", "Latency of the Ollama health probe", buckets=STAGE_BUCKETS
+)
+STARTUP_SECONDS = Gauge("documind_startup_seconds", "Time spent in each start-up phase", ["phase"])
+QUEUE_DEPTH = Gauge("documind_queue_depth", "Work waiting for a slot", ["queue"])
+IN_FLIGHT = Gauge("documind_in_flight", "Work currently holding a slot", ["queue"])
+BACKEND_IN_FLIGHT = Gauge("documind_ollama_host_in_flight", "Calls running on an Ollama host", ["host"])
+BACKEND_WAITING = Gauge("documind_ollama_host_waiting", "Calls waiting for a slot on an Ollama host", ["host"])
+BACKEND_UP = Gauge("documind_ollama_host_up", "1 if the last health probe of an Ollama host succeeded", ["host"])
+MODEL_RESIDENT = Gauge("documind_ollama_model_resident", "1 while a model is loaded on an Ollama host", ["host", "model"])
+MODEL_LOAD_SECONDS = Histogram(
+    "documind_ollama_model_load_seconds", "Time Ollama spent loading a model before a call", ["model"], buckets=LLM_BUCKETS
+)
+BACKEND_REQUESTS = Counter(
+    "documind_ollama_host_requests", "Calls sent to an Ollama host, by outcome (ok, failover, error)", ["host", "outcome"]
+)
+
+NANOSECONDS = 1e9
+# Ollama reports a few milliseconds of load_duration even for a resident model
+COLD_LOAD_SECONDS = 0.5
+
+_loaded_models = {}
+
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def observe_extraction(file_type: str, seconds: float):
+    EXTRACTION_SECONDS.labels(file_type).observe(seconds)
+
+
+def observe_llm_call(model: str, endpoint: str, seconds: float, response: Optional[dict] = None):
+    """Record one Ollama call; response is the final body or stream chunk carrying Ollama's timing fields"""
+    LLM_REQUEST_SECONDS.labels(model, endpoint).observe(seconds)
+    if response:
+        _observe_phase(model, "prompt", response.get("prompt_eval_count"), response.get("prompt_eval_duration"))
+        _observe_phase(model, "eval", response.get("eval_count"), response.get("eval_duration"))
+        observe_model_load(model, response.get("load_duration"))
+
+
+def observe_model_load(model: str, load_duration_ns: Optional[int]):
+    if load_duration_ns and load_duration_ns / NANOSECONDS >= COLD_LOAD_SECONDS:
+        MODEL_LOAD_SECONDS.labels(model).observe(load_duration_ns / NANOSECONDS)
+
+
+def _observe_phase(model: str, phase: str, tokens: Optional[int], duration_ns: Optional[int]):
+    # Ollama omits the prompt fields when the whole prompt came from its cache
+    if not tokens or not duration_ns:
+        return
+    seconds = duration_ns / NANOSECONDS
+    LLM_PHASE_SECONDS.labels(model, phase).observe(seconds)
+    LLM_TOKENS_PER_SECOND.labels(model, phase).observe(tokens / seconds)
+    LLM_TOKENS.labels(model, phase).inc(tokens)
+
+
+def observe_queue_wait(queue: str, seconds: float):
+    QUEUE_WAIT_SECONDS.labels(queue).observe(seconds)
+
+
+def observe_db_write(kind: str, seconds: float, rows: int):
+    DB_WRITE_SECONDS.labels(kind).observe(seconds)
+    DB_WRITE_ROWS.labels(kind).inc(rows)
+
+
+def observe_health_probe(seconds: float):
+    HEALTH_PROBE_SECONDS.observe(seconds)
+
+
+def observe_startup(phase: str, seconds: float):
+    STARTUP_SECONDS.labels(phase).set(seconds)
+
+
+def track_queue(queue: str, depth: Optional[Callable[[], float]] = None,
+                in_flight: Optional[Callable[[], float]] = None):
+    """Expose a scheduler's live counters; the callbacks run at scrape time"""
+    if depth is not None:
+        QUEUE_DEPTH.labels(queue).set_function(depth)
+    if in_flight is not None:
+        IN_FLIGHT.labels(queue).set_function(in_flight)
+
+
+def track_backend(host: str, in_flight: Callable[[], float], waiting: Callable[[], float],
+                  up: Callable[[], float]):
+    """Expose one Ollama host's live counters; the callbacks run at scrape time"""
+    BACKEND_IN_FLIGHT.labels(host).set_function(in_flight)
+    BACKEND_WAITING.labels(host).set_function(waiting)
+    BACKEND_UP.labels(host).set_function(up)
+
+
+def track_loaded_models(host: str, models: List[str]):
+    """Set the residency gauge for every model host has loaded, and clear it for models it unloaded"""
+    current = set(models)
+    for model in _loaded_models.get(host, set()) - current:
+        MODEL_RESIDENT.labels(host, model).set(0)
+    for model in current:
+        MODEL_RESIDENT.labels(host, model).set(1)
+    _loaded_models[host] = current
+
+
+def observe_backend_request(host: str, outcome: str):
+    BACKEND_REQUESTS.labels(host, outcome).inc()
+
+
+def render():
+    """Return (body, content_type) in the Prometheus text exposition format"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
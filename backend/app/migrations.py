@@ -0,0 +1,67 @@
+"""
+Schema setup, run from the application lifespan instead of at import time.
+
+create_all() only creates missing tables, so nullable columns added to a
+model after its table already existed (jobs.heartbeat_at) are added with
+ALTER TABLE, and indexes declared later (the composite history indexes) are
+created separately with a checkfirst. The full-text search index follows.
+Every step is idempotent.
+
+Set RUN_MIGRATIONS_ON_STARTUP=false to skip this in the app and run it
+once per deploy instead, e.g. before scaling out replicas:
+
+    python -m app.migrations
+"""
+import logging
+import os
+import time
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+from .database import Base, engine
+from .search import ensure_search_index
+
+logger = logging.getLogger(__name__)
+
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+
+
+def add_columns(bind: Engine):
+    """Add declared nullable columns missing from tables that predate them"""
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+
+def create_indexes(bind: Engine):
+    """Create declared indexes missing from tables that predate them"""
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def run_migrations(bind: Engine = engine) -> float:
+    """Bring the schema up to date; returns the time taken in seconds"""
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=bind)
+    add_columns(bind)
+    create_indexes(bind)
+    ensure_search_index(bind)
+    elapsed = time.perf_counter() - started
+    logger.info(f"Schema up to date in {elapsed * 1000:.0f} ms")
+    return elapsed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_migrations()
@@ -0,0 +1,87 @@
+"""
+Per-model Ollama keep_alive, chosen from recent traffic.
+
+Ollama unloads a model once it has been idle for the keep_alive sent with
+its last request, and the next request pays a multi-second load. Our traffic
+comes in bursts, so a fixed keep_alive is either too short (every burst
+starts cold) or holds GPU memory for models nobody uses. Every generation
+records its model here. The keep_alive sent with it covers the longest
+idle gap between bursts of that model's requests that ended within the last
+MODEL_TRAFFIC_WINDOW seconds, times MODEL_KEEP_ALIVE_HEADROOM, clamped to
+[MODEL_KEEP_ALIVE_MIN, MODEL_KEEP_ALIVE_MAX]. Only pauses of at least
+MODEL_KEEP_ALIVE_MIN count as idle gaps; gaps inside a burst say nothing
+about how long the model must stay loaded. A model with no recent idle gap
+(first burst, or steady traffic) gets MODEL_KEEP_ALIVE_DEFAULT.
+
+Load times reported by Ollama (load_duration) are kept per model, so the
+UI can say how long a cold start is expected to take.
+"""
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from . import metrics
+
+MODEL_TRAFFIC_WINDOW = float(os.getenv("MODEL_TRAFFIC_WINDOW", "7200"))
+MODEL_KEEP_ALIVE_MIN = float(os.getenv("MODEL_KEEP_ALIVE_MIN", "300"))
+MODEL_KEEP_ALIVE_MAX = float(os.getenv("MODEL_KEEP_ALIVE_MAX", "3600"))
+MODEL_KEEP_ALIVE_DEFAULT = float(os.getenv("MODEL_KEEP_ALIVE_DEFAULT", "1800"))
+MODEL_KEEP_ALIVE_HEADROOM = float(os.getenv("MODEL_KEEP_ALIVE_HEADROOM", "1.25"))
+WARMUP_MODELS = [model.strip() for model in os.getenv(
+    "WARMUP_MODELS", f"{os.getenv('SUMMARY_MODEL', 'llama3.2:3b')},{os.getenv('VISION_MODEL', 'llava:7b')}"
+).split(",") if model.strip()]
+
+_MAX_SAMPLES = 1000
+
+
+class ModelKeeper:
+    def __init__(self, window: float = MODEL_TRAFFIC_WINDOW, minimum: float = MODEL_KEEP_ALIVE_MIN,
+                 maximum: float = MODEL_KEEP_ALIVE_MAX, default: float = MODEL_KEEP_ALIVE_DEFAULT,
+                 headroom: float = MODEL_KEEP_ALIVE_HEADROOM):
+        self.window = window
+        self.minimum = minimum
+        self.maximum = maximum
+        self.default = default
+        self.headroom = headroom
+        self._requests: Dict[str, Deque[float]] = {}
+        # (ended_at, seconds) for pauses of at least the minimum keep_alive
+        self._idle_gaps: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._load_ms: Dict[str, float] = {}
+
+    def record(self, model: str):
+        now = time.monotonic()
+        requests = self._requests.setdefault(model, deque(maxlen=_MAX_SAMPLES))
+        if requests and now - requests[-1] >= self.minimum:
+            self._idle_gaps.setdefault(model, deque(maxlen=_MAX_SAMPLES)).append((now, now - requests[-1]))
+        requests.append(now)
+
+    def keep_alive_seconds(self, model: str) -> int:
+        now = time.monotonic()
+        gaps = [gap for ended_at, gap in self._idle_gaps.get(model, ()) if now - ended_at <= self.window]
+        if not gaps:
+            return int(self.default)
+        return int(min(self.maximum, max(self.minimum, max(gaps) * self.headroom)))
+
+    def keep_alive(self, model: str) -> str:
+        """keep_alive in the duration format Ollama accepts"""
+        return f"{self.keep_alive_seconds(model)}s"
+
+    def observe_load(self, model: str, load_duration_ns: Optional[int]):
+        # Every response carries load_duration; only real loads are worth remembering
+        seconds = (load_duration_ns or 0) / metrics.NANOSECONDS
+        if seconds >= metrics.COLD_LOAD_SECONDS:
+            self._load_ms[model] = round(seconds * 1000, 1)
+
+    def expected_load_ms(self, model: str) -> Optional[float]:
+        return self._load_ms.get(model)
+
+    def recent_requests(self, model: str) -> int:
+        now = time.monotonic()
+        return sum(1 for t in self._requests.get(model, ()) if now - t <= self.window)
+
+    def models(self) -> List[str]:
+        return sorted(set(WARMUP_MODELS) | set(self._requests))
+
+
+model_keeper = ModelKeeper()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Index
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -28,6 +28,9 @@ class Summary(Base):
     summary_style = Column(String(50))   # paragraph, bullet, etc.
     user_prompt = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # History pages are read newest-first per user with a (created_at, id) keyset
+    __table_args__ = (Index("ix_summaries_user_created_id", "user_id", "created_at", "id"),)
 
 class ImageAnalysis(Base):
     __tablename__ = "image_analyses"
@@ -37,4 +40,36 @@ class ImageAnalysis(Base):
     image_name = Column(String(500))
     analysis_text = Column(Text)
     story_text = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (Index("ix_image_analyses_user_created_id", "user_id", "created_at", "id"),)
+
+class SummaryCacheEntry(Base):
+    __tablename__ = "summary_cache"
+    
+    cache_key = Column(String(64), primary_key=True)  # sha256 of text + settings + model + prompt version
+    model = Column(String(100))
+    summary_text = Column(Text)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, index=True)        # naive UTC, compared against the TTL
+    last_accessed_at = Column(DateTime, index=True)  # naive UTC, drives size-based eviction
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(String(36), primary_key=True)  # uuid4
+    kind = Column(String(20))  # summarize, image
+    status = Column(String(20), index=True, default="queued")  # queued, running, succeeded, failed
+    user_id = Column(Integer, index=True, nullable=True)
+    file_name = Column(String(500))
+    input_path = Column(String(1000))  # uploaded file kept on disk until the job finishes
+    params = Column(Text)  # JSON: summary settings or story options
+    result = Column(Text, nullable=True)  # JSON, same shape the synchronous endpoint returns
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime, index=True)  # naive UTC; pushed back between retries
+    started_at = Column(DateTime, nullable=True)   # naive UTC
+    heartbeat_at = Column(DateTime, nullable=True)  # naive UTC; refreshed while a worker holds the job
+    finished_at = Column(DateTime, nullable=True)  # naive UTC
     created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Background Ollama health monitor, one per host in the backend pool.
+
+Probes /api/tags every OLLAMA_HEALTH_INTERVAL seconds and caches whether
+the host is reachable and which models are installed, and /api/ps for which
+of them are loaded in memory, so the pool can route and check availability
+without a network round trip. Probe results feed the
+host client's circuit breaker; while it is open, the host gets no calls.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from . import metrics
+from .llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "3"))
+
+
+class OllamaHealthMonitor:
+    def __init__(self, client: LLMClient, interval: float = OLLAMA_HEALTH_INTERVAL):
+        self.client = client
+        self.interval = interval
+        self.status = "unknown"
+        self.models: List[str] = []
+        self.loaded: List[str] = []
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.probe_latency_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._has_ps = True
+
+    async def probe(self) -> bool:
+        started = time.perf_counter()
+        try:
+            tags = await self.client.tags(timeout=OLLAMA_HEALTH_TIMEOUT)
+        except HTTPException as he:
+            if self.status != "unhealthy":
+                logger.error(f"Ollama health probe of {self.client.host} failed: {he.detail}")
+            self.status = "unhealthy"
+            self.last_error = he.detail
+            self._set_loaded([])
+            return False
+        finally:
+            elapsed = time.perf_counter() - started
+            self.last_checked = time.time()
+            self.probe_latency_ms = round(elapsed * 1000, 1)
+            metrics.observe_health_probe(elapsed)
+
+        if self.status != "healthy":
+            logger.info(f"Ollama is healthy at {self.client.host}")
+        self.status = "healthy"
+        self.last_error = None
+        self.models = [m.get("name", "") for m in tags.get("models", [])]
+        await self.refresh_loaded()
+        return True
+
+    async def refresh_loaded(self):
+        if not self._has_ps:
+            return
+        try:
+            running = await self.client.ps(timeout=OLLAMA_HEALTH_TIMEOUT)
+        except HTTPException as he:
+            if he.status_code != 503:
+                # Ollama before 0.1.33 has no /api/ps; residency is then only known from our own calls
+                self._has_ps = False
+            return
+        self._set_loaded([m.get("name", "") for m in running.get("models", [])])
+
+    def _set_loaded(self, models: List[str]):
+        self.loaded = models
+        metrics.track_loaded_models(self.client.host, models)
+
+    async def _run(self):
+        while True:
+            await self.probe()
+            # Probe sooner while the circuit is open so recovery is noticed quickly
+            delay = self.interval
+            retry_after = self.client.breaker.retry_after()
+            if self.status != "healthy" and retry_after:
+                delay = min(delay, retry_after)
+            await asyncio.sleep(delay)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def has_model(self, model: str) -> bool:
+        return _listed(model, self.models)
+
+    def is_loaded(self, model: str) -> bool:
+        return _listed(model, self.loaded)
+
+    def mark_loaded(self, model: str):
+        """Record a load seen in a call's response, ahead of the next /api/ps probe"""
+        if not self.is_loaded(model):
+            self._set_loaded(self.loaded + [model])
+
+    def snapshot(self) -> dict:
+        return {
+            "status": self.status,
+            "host": self.client.host,
+            "models": self.models,
+            "loaded": self.loaded,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+            "probe_latency_ms": self.probe_latency_ms,
+            "circuit": self.client.breaker.snapshot(),
+            "in_flight": self.client.in_flight,
+            "waiting": self.client.waiting,
+        }
+
+
+def _listed(model: str, names: List[str]) -> bool:
+    # Ollama reports "llama3.2:3b"; a bare "llava" means ":latest"
+    return model in names or f"{model}:latest" in names
@@ -0,0 +1,136 @@
+"""
+PDF text extraction.
+
+Small PDFs are read serially. Large PDFs are split into page ranges that are
+extracted in a ProcessPoolExecutor, so long reports use several cores and do
+not hold the request worker's GIL. Page texts are collected in a list and
+joined once (linear time), and progress is logged per page range rather than
+per page. Like the other parsers, text stops at EXTRACTION_MAX_CHARS:
+serial extraction reads pages lazily through iter_pdf_pages() and stops at
+the limit, and parallel extraction cancels the page ranges after the first
+ones that reach it.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Iterator, List, Optional
+
+import PyPDF2
+
+from .extractors import PAGE_BREAK
+from .ingestion import EXTRACTION_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that already runs the server's threads is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Worker entry point: extract pages [start, end) from the PDF at path"""
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def iter_pdf_pages(reader: PyPDF2.PdfReader) -> Iterator[str]:
+    """Lazily yield the text of each page, so callers can stop early"""
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def _extract_serial(reader: PyPDF2.PdfReader, max_chars: Optional[int]) -> List[str]:
+    pages = []
+    total_chars = 0
+    for page_text in iter_pdf_pages(reader):
+        pages.append(page_text)
+        total_chars += len(page_text)
+        if max_chars is not None and total_chars >= max_chars:
+            logger.info(f"Stopped PDF extraction after {len(pages)} pages ({total_chars} characters)")
+            break
+    return pages
+
+
+def _extract_parallel(fileobj: BinaryIO, num_pages: int, max_chars: Optional[int]) -> List[str]:
+    # Workers open the PDF by path, so only page-range tuples and page texts cross processes
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as spill:
+        fileobj.seek(0)
+        shutil.copyfileobj(fileobj, spill)
+        spill.flush()
+
+        ranges = [(start, min(start + PDF_PAGES_PER_TASK, num_pages))
+                  for start in range(0, num_pages, PDF_PAGES_PER_TASK)]
+        pool = _get_pool()
+        futures = {pool.submit(_extract_page_range, spill.name, start, end): start for start, end in ranges}
+
+        pages_by_start = {}
+        pages_done = 0
+        # Ranges finish out of order; only the unbroken run from page 0 counts towards max_chars
+        next_range = 0
+        prefix_chars = 0
+        for future in as_completed(futures):
+            start = futures[future]
+            pages_by_start[start] = future.result()
+            pages_done += len(pages_by_start[start])
+            logger.info(f"PDF extraction progress: {pages_done}/{num_pages} pages")
+            while next_range < len(ranges) and ranges[next_range][0] in pages_by_start:
+                prefix_chars += sum(len(page) for page in pages_by_start[ranges[next_range][0]])
+                next_range += 1
+            if max_chars is not None and prefix_chars >= max_chars:
+                for pending in futures:
+                    pending.cancel()
+                logger.info(f"Stopped PDF extraction after {ranges[next_range - 1][1]} pages ({prefix_chars} characters)")
+                break
+
+    pages = []
+    for start, _ in ranges[:next_range]:
+        pages.extend(pages_by_start[start])
+    return pages
+
+
+def extract_pdf_text(fileobj: BinaryIO, max_chars: Optional[int] = EXTRACTION_MAX_CHARS) -> str:
+    """Extract the text of a PDF, in parallel for large documents"""
+    reader = PyPDF2.PdfReader(fileobj)
+    num_pages = len(reader.pages)
+
+    if num_pages < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACTION_WORKERS <= 1:
+        pages = _extract_serial(reader, max_chars)
+    else:
+        logger.info(f"Extracting {num_pages} PDF pages with {PDF_EXTRACTION_WORKERS} worker processes")
+        try:
+            pages = _extract_parallel(fileobj, num_pages, max_chars)
+        except BrokenProcessPool:
+            logger.error("PDF worker pool crashed, falling back to serial extraction")
+            shutdown_pool()
+            pages = _extract_serial(reader, max_chars)
+
+    text = f"\n{PAGE_BREAK}".join(pages)
+    if max_chars is not None and len(text) > max_chars:
+        logger.warning(f"PDF text truncated at {max_chars} characters (EXTRACTION_MAX_CHARS)")
+        text = text[:max_chars]
+    logger.info(f"Total PDF text: {len(text)} characters from {len(pages)}/{num_pages} pages")
+    return text
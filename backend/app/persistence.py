@@ -0,0 +1,168 @@
+"""
+Write-behind persistence for summaries and image analyses.
+
+Handlers hand finished rows to WriteBehindQueue instead of writing them
+inside the request. A background task collects rows and writes each kind
+with one multi-row INSERT and one commit, as soon as PERSIST_BATCH_SIZE rows
+are waiting or PERSIST_FLUSH_INTERVAL seconds after the first one arrived.
+The queue holds at most PERSIST_QUEUE_MAX rows; when it is full, submit()
+waits, so a slow database applies backpressure instead of growing memory.
+Remaining rows are flushed on shutdown from the FastAPI lifespan.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import crud, metrics
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+PERSIST_QUEUE_MAX = int(os.getenv("PERSIST_QUEUE_MAX", "1000"))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "100"))
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "1.0"))
+PERSIST_MAX_RETRIES = int(os.getenv("PERSIST_MAX_RETRIES", "3"))
+
+_WRITERS = {
+    "summary": crud.bulk_create_summaries_async,
+    "image": crud.bulk_create_image_analyses_async,
+}
+
+
+async def _write_batch(kind: str, rows: List[dict]) -> int:
+    async with AsyncSessionLocal() as db:
+        try:
+            started = time.perf_counter()
+            written = await _WRITERS[kind](db, rows)
+            metrics.observe_db_write(kind, time.perf_counter() - started, written)
+            return written
+        except Exception:
+            await db.rollback()
+            raise
+
+
+class WriteBehindQueue:
+    def __init__(self, max_rows: int = PERSIST_QUEUE_MAX, batch_size: int = PERSIST_BATCH_SIZE,
+                 flush_interval: float = PERSIST_FLUSH_INTERVAL):
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"submitted": 0, "written": 0, "flushes": 0, "failures": 0, "dropped": 0}
+        self.last_flush_ms: Optional[float] = None
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    async def submit(self, kind: str, row: dict):
+        """Queue one row for writing; waits while the queue is full"""
+        if kind not in _WRITERS:
+            raise ValueError(f"Unknown row kind: {kind}")
+        if self._queue is None:
+            # Not running (e.g. scripts without the app lifespan): write through
+            await _write_batch(kind, [row])
+            return
+        await self._queue.put((kind, row))
+        self.counters["submitted"] += 1
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_rows)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write everything still queued, then stop the flusher"""
+        if self._task is None:
+            return
+        # The sentinel goes behind every queued row, so the flusher drains them first
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        # Rows submitted while the sentinel was already queued
+        late = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                late.append(item)
+        self._queue = None
+        if late:
+            await self._flush(late)
+
+    async def _collect(self) -> Tuple[List[Tuple[str, dict]], bool]:
+        """
+        Wait for a first row, then gather more until the batch is full or the
+        interval has passed. Returns (batch, keep_running).
+        """
+        item = await self._queue.get()
+        if item is None:
+            return [], False
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, False
+            batch.append(item)
+        return batch, True
+
+    async def _run(self):
+        running = True
+        while running:
+            batch, running = await self._collect()
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, dict]]):
+        by_kind: Dict[str, List[dict]] = {}
+        for kind, row in batch:
+            by_kind.setdefault(kind, []).append(row)
+
+        for kind, rows in by_kind.items():
+            for attempt in range(1, PERSIST_MAX_RETRIES + 1):
+                started = time.perf_counter()
+                try:
+                    written = await _write_batch(kind, rows)
+                except Exception as e:
+                    self.counters["failures"] += 1
+                    logger.error(f"Writing {len(rows)} {kind} row(s) failed (attempt {attempt}): {str(e)}")
+                    if attempt < PERSIST_MAX_RETRIES:
+                        await asyncio.sleep(attempt)
+                        continue
+                    self.counters["dropped"] += len(rows)
+                    logger.error(f"Dropped {len(rows)} {kind} row(s) after {attempt} attempts")
+                    break
+                self._record_flush((time.perf_counter() - started) * 1000, written)
+                break
+
+    def _record_flush(self, elapsed_ms: float, written: int):
+        self.counters["flushes"] += 1
+        self.counters["written"] += written
+        self.last_flush_ms = round(elapsed_ms, 1)
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+        self._total_flush_ms += elapsed_ms
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def snapshot(self) -> dict:
+        flushes = self.counters["flushes"]
+        return {
+            **self.counters,
+            "queue_depth": self.queue_depth,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": round(self._total_flush_ms / flushes, 1) if flushes else None,
+        }
+
+
+write_behind = WriteBehindQueue()
+metrics.track_queue("persistence", depth=lambda: write_behind.queue_depth)
@@ -0,0 +1,36 @@
+"""
+Pipelined batch execution for multi-file uploads.
+
+Each item goes through two stages: a CPU/IO-bound prepare stage (text
+extraction, run in the threadpool) and an LLM-bound process stage. Items
+flow independently, so extraction of file N+1 overlaps generation of file N.
+Total LLM concurrency is capped by the shared LLM client, and max_in_flight
+bounds how many prepared items (extracted texts) are held in memory at once.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BATCH_EXTRACT_CONCURRENCY = int(os.getenv("BATCH_EXTRACT_CONCURRENCY", "2"))
+BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", "6"))
+
+
+async def run_pipelined(items: Sequence[T],
+                        prepare: Callable[[int, T], Awaitable[Any]],
+                        process: Callable[[int, T, Any], Awaitable[R]],
+                        prepare_concurrency: int = BATCH_EXTRACT_CONCURRENCY,
+                        max_in_flight: int = BATCH_MAX_IN_FLIGHT) -> List[R]:
+    """Run prepare then process for every item with overlapping stages; results keep input order"""
+    prepare_slots = asyncio.Semaphore(max(1, prepare_concurrency))
+    in_flight = asyncio.Semaphore(max(1, max_in_flight, prepare_concurrency))
+
+    async def run(index: int, item: T) -> R:
+        async with in_flight:
+            async with prepare_slots:
+                prepared = await prepare(index, item)
+            return await process(index, item, prepared)
+
+    return list(await asyncio.gather(*(run(i, item) for i, item in enumerate(items))))
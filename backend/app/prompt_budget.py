@@ -0,0 +1,123 @@
+"""
+Token budgeting for Ollama prompts.
+
+Prompts are measured in tokens rather than characters, so document text
+and output are sized to the model's context window without Ollama silently
+truncating the start of the prompt.
+
+Every call to a model uses the same num_ctx: MODEL_CONTEXT_TOKENS, or the
+model's entry in MODEL_NUM_CTX (e.g. "llava:7b=4096"). Ollama reloads a model
+whenever num_ctx changes, so per-call window sizes would make concurrent
+map, reduce and story calls evict each other. Only the input and num_predict
+are budgeted per call.
+
+By default tokens are estimated at HEURISTIC_CHARS_PER_TOKEN characters per
+token, which over-counts slightly rather than overflow the window. The
+optional `tokenizers` package (not in requirements.txt) plus TOKENIZER_PATH
+pointing at the summary model's tokenizer.json gives exact counts instead.
+"""
+import logging
+import math
+import os
+from typing import Optional
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # optional dependency
+    Tokenizer = None
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_PATH = os.getenv("TOKENIZER_PATH")
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "llama3.2:3b")
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", "8192"))
+MODEL_NUM_CTX = {
+    model.strip(): int(tokens)
+    for model, tokens in (entry.rsplit("=", 1) for entry in os.getenv("MODEL_NUM_CTX", "").split(",") if "=" in entry)
+}
+CONTEXT_SAFETY_TOKENS = int(os.getenv("CONTEXT_SAFETY_TOKENS", "64"))
+HEURISTIC_CHARS_PER_TOKEN = float(os.getenv("HEURISTIC_CHARS_PER_TOKEN", "3.5"))
+
+# Upper bound of each length's word range, see summarizer.LENGTH_TOKENS
+LENGTH_WORDS = {"short": 150, "medium": 300, "long": 600}
+
+# Tokenizing a whole book just to learn it does not fit is wasted work
+_SAMPLE_CHARS = 50000
+
+
+class TokenCounter:
+    def __init__(self, tokenizer_path: Optional[str] = TOKENIZER_PATH):
+        self._tokenizer = None
+        if tokenizer_path and Tokenizer is not None:
+            try:
+                self._tokenizer = Tokenizer.from_file(tokenizer_path)
+                logger.info(f"Loaded tokenizer from {tokenizer_path}")
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer from {tokenizer_path}: {str(e)}")
+        elif tokenizer_path:
+            logger.warning("TOKENIZER_PATH is set but the 'tokenizers' package is not installed")
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return math.ceil(len(text) / HEURISTIC_CHARS_PER_TOKEN)
+
+    def chars_per_token(self, text: str) -> float:
+        """Characters per token for this document, measured on a sample"""
+        sample = text[:_SAMPLE_CHARS]
+        tokens = self.count(sample)
+        return len(sample) / tokens if tokens else HEURISTIC_CHARS_PER_TOKEN
+
+
+token_counter = TokenCounter()
+
+
+def count_tokens(text: str) -> int:
+    return token_counter.count(text)
+
+
+def output_tokens(length: str) -> int:
+    """num_predict for a final summary of the requested length"""
+    words = LENGTH_WORDS.get(length, LENGTH_WORDS["medium"])
+    return int(words * 1.6) + 128
+
+
+def num_ctx(model: str) -> int:
+    """The context window every call to model is sent with"""
+    return MODEL_NUM_CTX.get(model, MODEL_CONTEXT_TOKENS)
+
+
+def input_budget(template: str, num_predict: int, context_tokens: Optional[int] = None) -> int:
+    """Tokens left for document text once the template and the expected output are accounted for"""
+    if context_tokens is None:
+        context_tokens = num_ctx(SUMMARY_MODEL)
+    return max(0, context_tokens - count_tokens(template) - num_predict - CONTEXT_SAFETY_TOKENS)
+
+
+def tokens_to_chars(tokens: int, text: str) -> int:
+    """Convert a token budget into a character budget using this document's own ratio"""
+    return max(1, int(tokens * token_counter.chars_per_token(text)))
+
+
+def fits(text: str, tokens: int) -> bool:
+    # Cheap rejection first: no tokenizer packs more than ~8 characters into a token on average
+    if len(text) > tokens * 8:
+        return False
+    return count_tokens(text) <= tokens
+
+
+def call_options(prompt: str, num_predict: int, model: str = SUMMARY_MODEL) -> dict:
+    """The model's fixed num_ctx, and num_predict capped to the room the prompt leaves in it"""
+    context_tokens = num_ctx(model)
+    prompt_tokens = count_tokens(prompt)
+    room = context_tokens - prompt_tokens - CONTEXT_SAFETY_TOKENS
+    if room < num_predict:
+        logger.warning(f"Prompt of {prompt_tokens} tokens leaves {max(room, 0)} of {num_predict} output tokens in a {context_tokens} window")
+        num_predict = max(room, 1)
+    return {"num_ctx": context_tokens, "num_predict": num_predict}
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from ..database import get_async_db
+from .. import crud, schemas, search
+from .auth import get_current_user
+
+router = APIRouter()
+
+HISTORY_MAX_PAGE_SIZE = 100
+
+@router.get("/summaries", response_model=schemas.SummaryHistoryPage)
+async def list_summaries(
+    limit: int = Query(20, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Newest-first page of a user's summaries; pass next_cursor back to get the following page"""
+    try:
+        items, next_cursor = await crud.list_summaries_async(db, user_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/summaries/{summary_id}", response_model=schemas.SummaryDetail)
+async def get_summary(summary_id: int, user_id: int = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    summary = await crud.get_summary_async(db, user_id, summary_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Summary not found")
+    return summary
+
+@router.get("/images", response_model=schemas.ImageAnalysisHistoryPage)
+async def list_image_analyses(
+    limit: int = Query(20, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Newest-first page of a user's image analyses"""
+    try:
+        items, next_cursor = await crud.list_image_analyses_async(db, user_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/images/{analysis_id}", response_model=schemas.ImageAnalysisDetail)
+async def get_image_analysis(analysis_id: int, user_id: int = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    analysis = await crud.get_image_analysis_async(db, user_id, analysis_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Image analysis not found")
+    return analysis
+
+@router.get("/search", response_model=schemas.SearchResponse)
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Ranked full-text matches across a user's summaries and image analyses, with highlighted snippets"""
+    if kind is not None and kind not in search.SEARCH_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind '{kind}'. Use one of: {', '.join(search.SEARCH_KINDS)}")
+    rows = await search.search_history_async(db, user_id, q, kind, limit)
+    return {"results": [{**row, "id": row["record_id"]} for row in rows]}
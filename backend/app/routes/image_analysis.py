@@ -1,65 +1,268 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from sqlalchemy.orm import Session
-import ollama
-import base64
-from typing import Optional
-from ..database import get_db
-from .. import crud
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+from .. import crud, metrics
+from ..persistence import write_behind
+from ..llm_client import cancel_on_disconnect
+from ..backend_pool import backend_pool
+from ..singleflight import SingleFlight
+from ..image_processing import preprocess_image, image_cache
+from ..pipeline import run_pipelined
+from ..vision_scheduler import vision_scheduler
+from ..uploads import detach_upload, sse_event
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+VISION_MODEL = os.getenv("VISION_MODEL", "llava:7b")
+VISION_TIMEOUT = float(os.getenv("VISION_TIMEOUT", "300"))
+STORY_TEXT_MODEL = os.getenv("STORY_TEXT_MODEL", os.getenv("SUMMARY_MODEL", "llama3.2:3b"))
+
+image_flights = SingleFlight("image")
+
+STORY_MODES = ("parallel", "text")
+
+def image_settings_key(generate_story: bool, story_prompt: Optional[str], story_mode: str) -> str:
+    return f"{VISION_MODEL}|{generate_story}|{story_prompt or ''}|{story_mode if generate_story else ''}"
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+async def run_image_analysis(image_base64: str, generate_story: bool, story_prompt: Optional[str] = None,
+                             story_mode: str = "parallel"):
+    """
+    Describe an image with LLaVA and optionally write a story about it.
+    story_mode "parallel" runs both vision prompts at once; "text" writes the
+    story from the finished analysis with the text model, so the image is only
+    processed once. Returns (analysis_text, story_text, timings).
+    """
+    backend_pool.ensure_available(VISION_MODEL)
+    timings = {}
+    
+    # Analyze image with LLaVA
+    analysis_prompt = "Describe this image in detail. What do you see? What is happening?"
+    story_instruction = story_prompt or "Create an engaging short story based on this image."
+    
+    async def analyze():
+        started = time.perf_counter()
+        async with vision_scheduler.slot():
+            response = await backend_pool.generate(
+                model=VISION_MODEL,
+                prompt=analysis_prompt,
+                images=[image_base64],
+                timeout=VISION_TIMEOUT,
+                keep_alive=vision_scheduler.keep_alive
+            )
+        timings["analysisMs"] = elapsed_ms(started)
+        return response['response']
+    
+    async def vision_story():
+        started = time.perf_counter()
+        async with vision_scheduler.slot():
+            response = await backend_pool.generate(
+                model=VISION_MODEL,
+                prompt=f"{story_instruction}\n\nBased on the image, write a creative story (200-300 words):",
+                images=[image_base64],
+                timeout=VISION_TIMEOUT,
+                keep_alive=vision_scheduler.keep_alive
+            )
+        timings["storyMs"] = elapsed_ms(started)
+        return response['response']
+    
+    async def text_story(analysis_text: str):
+        started = time.perf_counter()
+        response = await backend_pool.generate(
+            model=STORY_TEXT_MODEL,
+            prompt=f"{story_instruction}\n\nHere is a detailed description of an image:\n{analysis_text}\n\n"
+                   f"Based on this description, write a creative story (200-300 words):",
+            timeout=VISION_TIMEOUT
+        )
+        timings["storyMs"] = elapsed_ms(started)
+        return response['response']
+    
+    if not generate_story:
+        return await analyze(), None, timings
+    
+    if story_mode == "text":
+        backend_pool.ensure_available(STORY_TEXT_MODEL)
+        analysis_text = await analyze()
+        return analysis_text, await text_story(analysis_text), timings
+    
+    analysis_text, story_text = await asyncio.gather(analyze(), vision_story())
+    return analysis_text, story_text, timings
+
+async def analyze_image_data(image_data: bytes, generate_story: bool, story_prompt: Optional[str] = None,
+                             story_mode: str = "parallel"):
+    """
+    Preprocess an upload, then serve it from the perceptual-hash cache or run
+    LLaVA once. Returns (analysis_text, story_text, timings).
+    """
+    if story_mode not in STORY_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown story_mode '{story_mode}'. Use one of: {', '.join(STORY_MODES)}")
+    
+    started = time.perf_counter()
+    with metrics.stage_timer("image_preprocess"):
+        image = await run_in_threadpool(preprocess_image, image_data)
+    timings = {"preprocessMs": elapsed_ms(started)}
+    settings_key = image_settings_key(generate_story, story_prompt, story_mode)
+    
+    cached = image_cache.get(settings_key, image.phash)
+    if cached is not None:
+        analysis_text, story_text = cached
+        timings.update({"cached": True, "totalMs": elapsed_ms(started)})
+        return analysis_text, story_text, timings
+    
+    async def generate():
+        analysis_text, story_text, stage_timings = await run_image_analysis(
+            image.base64, generate_story, story_prompt, story_mode
+        )
+        image_cache.put(settings_key, image.phash, (analysis_text, story_text))
+        return analysis_text, story_text, stage_timings
+    
+    # Identical images submitted at the same time share one LLaVA run
+    analysis_text, story_text, stage_timings = await image_flights.do(f"{settings_key}|{image.phash:016x}", generate)
+    timings.update(stage_timings)
+    timings.update({"cached": False, "totalMs": elapsed_ms(started)})
+    return analysis_text, story_text, timings
+
+async def save_image_analysis(user_id: int, image_name: str, analysis_text: str, story_text: Optional[str]):
+    """Queue an analysis row for the write-behind flusher"""
+    await write_behind.submit("image", crud.image_analysis_row(
+        user_id=user_id,
+        image_name=image_name,
+        analysis_text=analysis_text,
+        story_text=story_text
+    ))
 
 @router.post("/analyze-image")
 async def analyze_image(
+    request: Request,
     image: UploadFile = File(...),
     generate_story: bool = Form(False),
     story_prompt: Optional[str] = Form(None),
-    user_id: Optional[int] = Form(None),
-    db: Session = Depends(get_db)
+    story_mode: str = Form("parallel"),
+    user_id: Optional[int] = Form(None)
 ):
     try:
-        # Read and encode image
         image_data = await image.read()
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        
-        # Analyze image with LLaVA
-        analysis_prompt = "Describe this image in detail. What do you see? What is happening?"
         
-        analysis_response = ollama.generate(
-            model='llava:7b',
-            prompt=analysis_prompt,
-            images=[image_base64]
+        analysis_text, story_text, timings = await cancel_on_disconnect(
+            request, analyze_image_data(image_data, generate_story, story_prompt, story_mode)
         )
         
-        analysis_text = analysis_response['response']
-        story_text = None
-        
-        # Generate story if requested
-        if generate_story:
-            story_instruction = story_prompt or "Create an engaging short story based on this image."
-            
-            story_response = ollama.generate(
-                model='llava:7b',
-                prompt=f"{story_instruction}\n\nBased on the image, write a creative story (200-300 words):",
-                images=[image_base64]
-            )
-            
-            story_text = story_response['response']
-        
         # Save to database
         if user_id:
-            crud.create_image_analysis(
-                db,
-                user_id=user_id,
-                image_name=image.filename,
-                analysis_text=analysis_text,
-                story_text=story_text
-            )
+            await save_image_analysis(user_id, image.filename, analysis_text, story_text)
         
         return {
             "analysis": analysis_text,
             "story": story_text,
-            "fileName": image.filename
+            "fileName": image.filename,
+            "timings": timings
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error analyzing image: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error analyzing image: {str(e)}")
+
+async def stream_image_batch(images: List[UploadFile], generate_story: bool, story_prompt: Optional[str],
+                             story_mode: str, user_id: Optional[int]):
+    """Yield server-sent events for each image as soon as its analysis finishes (completion order)"""
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def read(idx: int, image: UploadFile) -> Optional[bytes]:
+        try:
+            return await run_in_threadpool(image.file.read)
+        except Exception as e:
+            logger.error(f"Could not read {image.filename}: {str(e)}")
+            await events.put(sse_event("error", {"index": idx, "fileName": image.filename, "error": f"Could not read upload: {str(e)}"}))
+            return None
+    
+    async def analyze(idx: int, image: UploadFile, image_data: Optional[bytes]):
+        if image_data is None:
+            return False
+        try:
+            analysis_text, story_text, timings = await analyze_image_data(
+                image_data, generate_story, story_prompt, story_mode
+            )
+            if user_id:
+                try:
+                    await save_image_analysis(user_id, image.filename, analysis_text, story_text)
+                except Exception as db_error:
+                    logger.error(f"Database error: {str(db_error)}")
+            await events.put(sse_event("image_done", {
+                "index": idx,
+                "fileName": image.filename,
+                "analysis": analysis_text,
+                "story": story_text,
+                "timings": timings
+            }))
+            return True
+        except HTTPException as he:
+            logger.error(f"HTTP error analyzing {image.filename}: {he.detail}")
+            await events.put(sse_event("error", {"index": idx, "fileName": image.filename, "error": he.detail}))
+        except Exception as e:
+            logger.error(f"Unexpected error analyzing {image.filename}: {str(e)}")
+            await events.put(sse_event("error", {"index": idx, "fileName": image.filename, "error": f"Unexpected error: {str(e)}"}))
+        return False
+    
+    async def run_batch():
+        try:
+            outcomes = await run_pipelined(images, read, analyze)
+            await events.put(sse_event("done", {"total": len(images), "successful": sum(outcomes)}))
+        except Exception as e:
+            logger.error(f"Batch image analysis failed: {str(e)}")
+            await events.put(sse_event("error", {"error": f"Batch failed: {str(e)}"}))
+        finally:
+            # The stream below waits for this marker; it must arrive however the batch ends
+            events.put_nowait(None)
+    
+    batch = asyncio.create_task(run_batch())
+    try:
+        yield sse_event("batch_start", {"total": len(images), "scheduler": vision_scheduler.stats()})
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        # Client went away or the batch finished: stop scheduling remaining images
+        batch.cancel()
+        await asyncio.gather(batch, return_exceptions=True)
+        for image in images:
+            image.file.close()
+
+@router.post("/analyze-images")
+async def analyze_images(
+    images: List[UploadFile] = File(...),
+    generate_story: bool = Form(False),
+    story_prompt: Optional[str] = Form(None),
+    story_mode: str = Form("parallel"),
+    user_id: Optional[int] = Form(None)
+):
+    """Batch variant of /analyze-image: results stream back as server-sent events as each image completes"""
+    logger.info(f"Received batch image analysis request for {len(images)} image(s)")
+    if story_mode not in STORY_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown story_mode '{story_mode}'. Use one of: {', '.join(STORY_MODES)}")
+    
+    detached = [await run_in_threadpool(detach_upload, image) for image in images]
+    return StreamingResponse(
+        stream_image_batch(detached, generate_story, story_prompt, story_mode, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/cache/stats")
+def image_cache_stats():
+    return {**image_cache.stats(), "singleflight": image_flights.stats(), "scheduler": vision_scheduler.stats()}
+
+@router.get("/model-status")
+def image_model_status():
+    """Whether the vision model is loaded, so the UI can warn that a cold start will be slow"""
+    return backend_pool.model_status(VISION_MODEL)
\ No newline at end of file
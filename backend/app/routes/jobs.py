@@ -0,0 +1,132 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from typing import List, Optional
+import json
+import logging
+from .. import crud, models
+from ..database import SessionLocal
+from ..jobs import job_pool, store_upload
+from ..compression import parse_ratio
+from ..uploads import parse_settings
+from .summarize import (
+    extract_text_from_file, generate_summary_with_ollama, save_summary, query_document_id
+)
+from .image_analysis import analyze_image_data, save_image_analysis
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+async def run_summarize_job(job: models.Job) -> dict:
+    settings = json.loads(job.params)
+    with open(job.input_path, "rb") as handle:
+        text = await run_in_threadpool(extract_text_from_file, UploadFile(file=handle, filename=job.file_name))
+    
+    if not text.strip():
+        raise HTTPException(status_code=422, detail="File is empty or contains no readable text")
+    
+    summary = await generate_summary_with_ollama(
+        text,
+        settings.get('length', 'medium'),
+        settings.get('style', 'paragraph'),
+        settings.get('userQuery'),
+        bypass_cache=bool(settings.get('bypassCache')),
+        compression_ratio=parse_ratio(settings.get('compressionRatio'))
+    )
+    
+    if job.user_id:
+        await save_summary(job.user_id, job.file_name, text, summary, settings)
+    
+    result = {"fileName": job.file_name, "summary": summary}
+    document_id = await query_document_id(text, settings)
+    if document_id:
+        result["documentId"] = document_id
+    return result
+
+async def run_image_job(job: models.Job) -> dict:
+    params = json.loads(job.params)
+    with open(job.input_path, "rb") as handle:
+        image_data = handle.read()
+    
+    analysis_text, story_text, timings = await analyze_image_data(
+        image_data, params.get("generate_story", False), params.get("story_prompt"),
+        params.get("story_mode", "parallel")
+    )
+    
+    if job.user_id:
+        await save_image_analysis(job.user_id, job.file_name, analysis_text, story_text)
+    
+    return {"analysis": analysis_text, "story": story_text, "fileName": job.file_name, "timings": timings}
+
+job_pool.register("summarize", run_summarize_job)
+job_pool.register("image", run_image_job)
+
+def job_status(job: models.Job) -> dict:
+    return {
+        "jobId": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "fileName": job.file_name,
+        "attempts": job.attempts,
+        "maxAttempts": job.max_attempts,
+        "error": job.error,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "startedAt": job.started_at.isoformat() if job.started_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def load_job(job_id: str) -> models.Job:
+    db = SessionLocal()
+    try:
+        job = crud.get_job(db, job_id)
+    finally:
+        db.close()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/summarize")
+async def submit_summarize_jobs(
+    files: List[UploadFile] = File(...),
+    settings_json: Optional[str] = Form(None),
+    user_id: Optional[int] = Form(None)
+):
+    """Queue one summarization job per file and return immediately"""
+    settings = parse_settings(settings_json)
+    submitted = []
+    for file in files:
+        job_id = await run_in_threadpool(store_upload, file.file, file.filename, "summarize", settings, user_id)
+        submitted.append({"jobId": job_id, "fileName": file.filename, "status": "queued"})
+    job_pool.notify()
+    logger.info(f"Queued {len(submitted)} summarization job(s)")
+    return submitted
+
+@router.post("/analyze-image")
+async def submit_image_job(
+    image: UploadFile = File(...),
+    generate_story: bool = Form(False),
+    story_prompt: Optional[str] = Form(None),
+    story_mode: str = Form("parallel"),
+    user_id: Optional[int] = Form(None)
+):
+    """Queue an image analysis job and return immediately"""
+    params = {"generate_story": generate_story, "story_prompt": story_prompt, "story_mode": story_mode}
+    job_id = await run_in_threadpool(store_upload, image.file, image.filename, "image", params, user_id)
+    job_pool.notify()
+    return {"jobId": job_id, "fileName": image.filename, "status": "queued"}
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: str):
+    job = await run_in_threadpool(load_job, job_id)
+    return job_status(job)
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await run_in_threadpool(load_job, job_id)
+    if job.status == "succeeded":
+        return json.loads(job.result)
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=job.error or "Job failed")
+    # Not finished yet: 202 tells pollers to come back later
+    return JSONResponse(status_code=202, content=job_status(job))
\ No newline at end of file
@@ -1,18 +1,25 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-import ollama
+import asyncio
 import json
-from io import BytesIO
-import PyPDF2
-import docx
-import mammoth
-import openpyxl
 import logging
-import requests
 import os
-from ..database import get_db
-from .. import crud
+import time
+from .. import crud, metrics, summarizer
+from ..persistence import write_behind
+from ..llm_client import cancel_on_disconnect
+from ..backend_pool import backend_pool
+from ..summary_cache import summary_cache, make_cache_key, CACHE_ENABLED
+from ..singleflight import SingleFlight
+from ..pipeline import run_pipelined
+from ..extractors import registry as extractor_registry
+from ..compression import compress_text, compression_stats
+from ..embeddings import document_id_for, index_store
+from .. import prompt_budget
+from ..ingestion import check_upload_size
+from ..uploads import detach_upload, parse_settings, sse_event
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,257 +27,420 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "llama3.2:3b")
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "300"))
+
+summary_flights = SingleFlight("summary")
+
 def extract_text_from_file(file: UploadFile) -> str:
     """Extract text from various file types"""
+    started = time.perf_counter()
+    text = _extract_text(file)
+    file_type = os.path.splitext(file.filename.lower())[1].lstrip('.')
+    metrics.observe_extraction(file_type, time.perf_counter() - started)
+    return text
+
+def _extract_text(file: UploadFile) -> str:
     filename = file.filename.lower()
-    file.file.seek(0)
     
     try:
-        if filename.endswith('.txt'):
-            content = file.file.read().decode('utf-8', errors='ignore')
-            logger.info(f"Extracted {len(content)} characters from TXT file")
-            return content
-        
-        elif filename.endswith('.pdf'):
-            pdf_reader = PyPDF2.PdfReader(file.file)
-            text = ""
-            for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text() or ""
-                text += page_text
-                logger.info(f"Extracted page {page_num + 1}/{len(pdf_reader.pages)}")
-            logger.info(f"Total PDF text: {len(text)} characters")
-            return text
-        
-        elif filename.endswith('.docx'):
-            doc = docx.Document(BytesIO(file.file.read()))
-            text = "\n".join([p.text for p in doc.paragraphs])
-            logger.info(f"Extracted {len(text)} characters from DOCX")
-            return text
-        
-        elif filename.endswith('.doc'):
-            result = mammoth.extract_raw_text(BytesIO(file.file.read()))
-            logger.info(f"Extracted {len(result.value)} characters from DOC")
-            return result.value
+        check_upload_size(file.file, file.filename)
         
-        elif filename.endswith('.xlsx'):
-            wb = openpyxl.load_workbook(BytesIO(file.file.read()), data_only=True)
-            text = ""
-            for sheet in wb.sheetnames:
-                ws = wb[sheet]
-                for row in ws.iter_rows():
-                    values = [str(cell.value) if cell.value else "" for cell in row]
-                    text += " ".join(values) + "\n"
-            logger.info(f"Extracted {len(text)} characters from XLSX")
-            return text
-        
-        else:
+        extractor = extractor_registry.get(filename)
+        if extractor is None:
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {filename}")
+        
+        text = extractor.extract(file.file)
+        logger.info(f"Extracted {len(text)} characters from {extractor.label}")
+        return text
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error extracting text from {filename}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error extracting text: {str(e)}")
 
 def check_ollama_connection():
-    """Check if Ollama service is running and accessible"""
-    ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+    """Check the cached Ollama health; fails fast with 503 while the circuit is open"""
+    backend_pool.ensure_available(SUMMARY_MODEL)
+    return True
+
+DEFAULT_OPTIONS = {
+    'temperature': 0.7,
+    'top_p': 0.9,
+    'top_k': 40,
+}
+
+async def call_ollama(prompt: str, options: dict = None) -> str:
+    """Run a single generation against Llama 3.2 and return the response text"""
+    logger.info("Calling Ollama API to generate summary...")
+    response = await backend_pool.generate(
+        model=SUMMARY_MODEL,
+        prompt=prompt,
+        options={**DEFAULT_OPTIONS, **(options or {})},
+        timeout=SUMMARY_TIMEOUT
+    )
+    logger.info("Ollama API response received successfully")
+    return response['response'].strip()
+
+def summary_cache_key(text: str, length: str, style: str, user_prompt: str = None,
+                      compression_ratio: float = 1.0) -> str:
+    return make_cache_key(text, length, style, user_prompt, SUMMARY_MODEL, summarizer.PROMPT_TEMPLATE_VERSION,
+                          compressionRatio=compression_ratio)
+
+async def compress_for_llm(text: str, compression_ratio: float):
+    """Run the optional extractive pre-compression stage; returns (text, tokens_saved)"""
+    if compression_ratio >= 1.0:
+        return text, 0
+    with metrics.stage_timer("compress"):
+        result = await run_in_threadpool(compress_text, text, compression_ratio)
+    return result.text, result.tokens_saved
+
+def query_budget(text: str, length: str, style: str, user_prompt: str = None) -> Optional[int]:
+    """Token budget for the query's chunks when the document is too long for one query prompt, else None"""
+    if not (user_prompt or '').strip():
+        return None
+    budget = summarizer.final_input_budget(length, style, user_prompt)
+    return None if prompt_budget.fits(text, budget) else budget
+
+async def query_document_id(text: str, settings: dict) -> Optional[str]:
+    """
+    Id of the chunk index follow-up queries can use, for documents too long for
+    one query prompt. The summary cache is shared but indexes are local, so a
+    cache hit builds the index if this replica does not have it (any more).
+    """
+    length, style = settings.get('length', 'medium'), settings.get('style', 'paragraph')
+    if query_budget(text, length, style, settings.get('userQuery')) is None:
+        return None
+    document_id = document_id_for(text)
+    if not index_store.has(document_id):
+        with metrics.stage_timer("embed_index"):
+            await index_store.get_or_build(text)
+    return document_id
+
+async def prepare_llm_text(text: str, length: str, style: str, user_prompt: str = None,
+                           compression_ratio: float = 1.0):
+    """
+    Pick the text the LLM will read: the chunks most relevant to the query when
+    the document is too long for one prompt, otherwise the (optionally
+    compressed) document. Only the first case embeds the document. Returns
+    (text, tokens_saved by compression).
+    """
+    budget = query_budget(text, length, style, user_prompt)
+    if budget is not None:
+        with metrics.stage_timer("embed_index"):
+            document_index = await index_store.get_or_build(text)
+        with metrics.stage_timer("retrieve"):
+            return await index_store.relevant_text(document_index, user_prompt, budget), 0
+    return await compress_for_llm(text, compression_ratio)
+
+async def cached_summary(cache_key: str, produce, bypass_cache: bool = False) -> str:
+    """Serve a summary from the cache, or run produce() once for all concurrent identical requests"""
+    if CACHE_ENABLED and not bypass_cache:
+        cached = await summary_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Summary cache hit")
+            return cached
+    elif CACHE_ENABLED:
+        summary_cache.record_bypass()
     
-    try:
-        logger.info(f"Checking Ollama connection at {ollama_host}")
-        response = requests.get(f"{ollama_host}/api/tags", timeout=5)
+    async def generate():
+        # Check Ollama connection first
+        check_ollama_connection()
         
-        if response.status_code == 200:
-            models = response.json()
-            logger.info(f"Ollama is running. Available models: {models}")
-            return True
-        else:
-            logger.error(f"Ollama returned status code: {response.status_code}")
-            return False
-            
-    except requests.exceptions.ConnectionError:
-        logger.error(f"Cannot connect to Ollama at {ollama_host}")
-        raise HTTPException(
-            status_code=503,
-            detail=f"Cannot connect to Ollama service at {ollama_host}. Please ensure Ollama is running. Start it with 'ollama serve' command."
-        )
-    except requests.exceptions.Timeout:
-        logger.error("Ollama connection timeout")
-        raise HTTPException(
-            status_code=503,
-            detail="Ollama service timeout. Please check if Ollama is running properly."
-        )
-    except Exception as e:
-        logger.error(f"Error checking Ollama: {str(e)}")
-        raise HTTPException(
-            status_code=503,
-            detail=f"Error connecting to Ollama: {str(e)}"
-        )
-
-def generate_summary_with_ollama(text: str, length: str, style: str, user_prompt: str = None) -> str:
-    """Generate summary using Ollama Llama 3.2"""
+        summary = await produce()
+        logger.info(f"Generated summary length: {len(summary)} characters")
+        
+        if CACHE_ENABLED:
+            await summary_cache.put(cache_key, summary, SUMMARY_MODEL)
+        return summary
+    
+    # Identical documents uploaded at the same time share one generation
+    return await summary_flights.do(cache_key, generate)
+
+async def generate_summary_with_ollama(text: str, length: str, style: str, user_prompt: str = None,
+                                       bypass_cache: bool = False, compression_ratio: float = 1.0) -> str:
+    """Generate summary using Ollama Llama 3.2, map-reducing documents too long for one prompt"""
     
     logger.info(f"Starting summarization - Length: {length}, Style: {style}")
     logger.info(f"Text length: {len(text)} characters")
     
-    # Check Ollama connection first
-    check_ollama_connection()
-    
-    length_tokens = {
-        "short": "100-150 words",
-        "medium": "250-300 words",
-        "long": "500-600 words"
-    }
-    
-    style_instructions = {
-        "paragraph": "Write in clear, flowing paragraphs.",
-        "bullet": "Use bullet points with • symbol. Start each point on a new line.",
-        "flashcard": "Format as Q&A flashcards. Use 'Q:' and 'A:' prefixes.",
-        "mindmap": "Create a hierarchical structure with main topics and subtopics using indentation.",
-        "keypoints": "List the key points numbered 1, 2, 3, etc."
-    }
+    async def produce():
+        llm_text, _ = await prepare_llm_text(text, length, style, user_prompt, compression_ratio)
+        with metrics.stage_timer("summarize"):
+            return await summarizer.map_reduce_summarize(llm_text, length, style, user_prompt, generate=call_ollama)
     
-    # Truncate text if too long
-    max_text_length = 15000
-    if len(text) > max_text_length:
-        text = text[:max_text_length]
-        logger.info(f"Text truncated to {max_text_length} characters")
-    
-    prompt = f"""Summarize the following text.
-Length: {length_tokens.get(length, '250-300 words')}
-Style: {style_instructions.get(style, 'Write in clear paragraphs.')}
-{f'Additional instructions: {user_prompt}' if user_prompt else ''}
+    cache_key = summary_cache_key(text, length, style, user_prompt, compression_ratio)
+    return await cached_summary(cache_key, produce, bypass_cache)
 
-Text to summarize:
-{text}
+@router.get("/cache/stats")
+def summary_cache_stats():
+    return {"enabled": CACHE_ENABLED, **summary_cache.stats(), "singleflight": summary_flights.stats()}
 
-Summary:"""
-    
-    try:
-        logger.info("Calling Ollama API to generate summary...")
-        
-        # Call Ollama with options
-        response = ollama.generate(
-            model='llama3.2:3b',
-            prompt=prompt,
-            options={
-                'temperature': 0.7,
-                'top_p': 0.9,
-                'top_k': 40,
-            }
-        )
-        
-        logger.info("Ollama API response received successfully")
-        
-        if not response or 'response' not in response:
-            logger.error("Ollama returned empty or invalid response")
-            raise HTTPException(status_code=500, detail="Ollama returned empty response")
-        
-        summary = response['response'].strip()
-        logger.info(f"Generated summary length: {len(summary)} characters")
-        
-        return summary
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Ollama generation error: {error_msg}")
-        
-        # Check for specific errors
-        if "model" in error_msg.lower() and "not found" in error_msg.lower():
-            raise HTTPException(
-                status_code=500, 
-                detail="Model 'llama3.2:3b' not found. Please run: ollama pull llama3.2:3b"
-            )
-        elif "connection" in error_msg.lower():
-            raise HTTPException(
-                status_code=503,
-                detail="Lost connection to Ollama service. Please check if Ollama is still running."
-            )
-        else:
-            raise HTTPException(status_code=500, detail=f"Error generating summary: {error_msg}")
+@router.get("/compression/stats")
+def summary_compression_stats():
+    return compression_stats.snapshot()
+
+@router.get("/model-status")
+def summary_model_status():
+    """Whether the summary model is loaded, so the UI can warn that a cold start will be slow"""
+    return backend_pool.model_status(SUMMARY_MODEL)
 
 @router.post("/summarize")
 async def summarize_files(
+    request: Request,
     files: List[UploadFile] = File(...),
     settings_json: Optional[str] = Form(None),
-    user_id: Optional[int] = Form(None),
-    db: Session = Depends(get_db)
+    user_id: Optional[int] = Form(None)
 ):
     logger.info(f"Received summarization request for {len(files)} file(s)")
     
-    settings = {"length": "medium", "style": "paragraph", "userQuery": ""}
+    settings = parse_settings(settings_json)
     
-    if settings_json:
+    async def extract(idx: int, file: UploadFile):
+        logger.info(f"Extracting file {idx + 1}/{len(files)}: {file.filename}")
         try:
-            settings.update(json.loads(settings_json))
-            logger.info(f"Settings: {settings}")
+            # Extract text off the event loop; parsing is CPU-bound
+            return await run_in_threadpool(extract_text_from_file, file)
         except Exception as e:
-            logger.warning(f"Error parsing settings: {e}")
+            return e
     
-    results = []
-    
-    for idx, file in enumerate(files):
-        logger.info(f"Processing file {idx + 1}/{len(files)}: {file.filename}")
-        
+    async def summarize(idx: int, file: UploadFile, text):
         try:
-            # Extract text
-            text = extract_text_from_file(file)
+            if isinstance(text, Exception):
+                raise text
             
             if not text.strip():
                 logger.warning(f"File {file.filename} is empty")
-                results.append({
+                return {
                     "fileName": file.filename,
                     "error": "File is empty or contains no readable text"
-                })
-                continue
+                }
             
             # Generate summary
             logger.info(f"Generating summary for {file.filename}")
-            summary = generate_summary_with_ollama(
+            summary = await generate_summary_with_ollama(
                 text,
                 settings.get('length', 'medium'),
                 settings.get('style', 'paragraph'),
-                settings.get('userQuery')
+                settings.get('userQuery'),
+                bypass_cache=bool(settings.get('bypassCache')),
+                compression_ratio=settings['compressionRatio']
             )
             
             # Save to database
             if user_id:
-                logger.info(f"Saving summary to database for user {user_id}")
                 try:
-                    crud.create_summary(
-                        db,
-                        user_id=user_id,
-                        file_name=file.filename,
-                        original_text=text,
-                        summary_text=summary,
-                        length=settings.get('length'),
-                        style=settings.get('style'),
-                        user_prompt=settings.get('userQuery')
-                    )
-                    logger.info("Summary saved to database successfully")
+                    await save_summary(user_id, file.filename, text, summary, settings)
                 except Exception as db_error:
                     logger.error(f"Database error: {str(db_error)}")
                     # Don't fail the request if DB save fails
             
-            results.append({
+            logger.info(f"Successfully processed {file.filename}")
+            result = {
                 "fileName": file.filename,
                 "summary": summary
-            })
-            
-            logger.info(f"Successfully processed {file.filename}")
+            }
+            document_id = await query_document_id(text, settings)
+            if document_id:
+                result["documentId"] = document_id
+            return result
             
         except HTTPException as he:
             logger.error(f"HTTP error processing {file.filename}: {he.detail}")
-            results.append({
+            return {
                 "fileName": file.filename,
                 "error": he.detail
-            })
+            }
         except Exception as e:
             logger.error(f"Unexpected error processing {file.filename}: {str(e)}")
-            results.append({
+            return {
                 "fileName": file.filename,
                 "error": f"Unexpected error: {str(e)}"
-            })
+            }
+    
+    # Extraction of later files overlaps generation of earlier ones; the whole
+    # batch is abandoned if the client goes away
+    results = await cancel_on_disconnect(request, run_pipelined(files, extract, summarize))
     
     logger.info(f"Completed processing {len(files)} file(s). Successful: {sum(1 for r in results if 'summary' in r)}")
-    return results
\ No newline at end of file
+    return results
+
+async def save_summary(user_id: int, file_name: str, text: str, summary: str, settings: dict):
+    """Queue a summary row for the write-behind flusher"""
+    await write_behind.submit("summary", crud.summary_row(
+        user_id=user_id,
+        file_name=file_name,
+        original_text=text,
+        summary_text=summary,
+        length=settings.get('length'),
+        style=settings.get('style'),
+        user_prompt=settings.get('userQuery')
+    ))
+
+async def stream_generation(file_name: str, text: str, settings: dict, parts: List[str]):
+    """Yield chunk progress and token events for one document, collecting generated tokens into parts"""
+    check_ollama_connection()
+
+    text, tokens_saved = await prepare_llm_text(
+        text,
+        settings.get('length', 'medium'),
+        settings.get('style', 'paragraph'),
+        settings.get('userQuery'),
+        settings['compressionRatio']
+    )
+    if tokens_saved:
+        yield sse_event("compressed", {"fileName": file_name, "tokensSaved": tokens_saved})
+
+    # Same stage as the non-streaming path: map/reduce and the final generation
+    with metrics.stage_timer("summarize"):
+        # Map/reduce progress arrives from concurrent tasks; relay it through a queue
+        progress = asyncio.Queue()
+        prompt_task = asyncio.ensure_future(summarizer.build_final_prompt(
+            text,
+            settings.get('length', 'medium'),
+            settings.get('style', 'paragraph'),
+            settings.get('userQuery'),
+            generate=call_ollama,
+            on_progress=lambda stage, done, total: progress.put_nowait((stage, done, total))
+        ))
+        try:
+            while not prompt_task.done() or not progress.empty():
+                getter = asyncio.ensure_future(progress.get())
+                await asyncio.wait({getter, prompt_task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    stage, done, total = getter.result()
+                    yield sse_event("chunk", {"fileName": file_name, "stage": stage, "completed": done, "total": total})
+                else:
+                    getter.cancel()
+            prompt = prompt_task.result()
+        finally:
+            prompt_task.cancel()
+
+        async for chunk in backend_pool.generate_stream(
+            model=SUMMARY_MODEL,
+            prompt=prompt,
+            options={**DEFAULT_OPTIONS, **summarizer.final_options(prompt, settings.get('length', 'medium'))},
+            timeout=SUMMARY_TIMEOUT
+        ):
+            token = chunk.get('response', '')
+            if token:
+                parts.append(token)
+                yield sse_event("token", {"fileName": file_name, "text": token})
+
+async def stream_summaries(files: List[UploadFile], settings: dict, user_id: Optional[int]):
+    """Yield server-sent events for extraction, map/reduce progress and summary tokens, file by file"""
+    successful = 0
+    try:
+        for idx, file in enumerate(files):
+            yield sse_event("file_start", {"index": idx, "fileName": file.filename, "total": len(files)})
+            try:
+                text = await run_in_threadpool(extract_text_from_file, file)
+                if not text.strip():
+                    yield sse_event("error", {"fileName": file.filename, "error": "File is empty or contains no readable text"})
+                    continue
+                yield sse_event("extracted", {"fileName": file.filename, "characters": len(text)})
+                cache_key = None
+                cached = None
+                if CACHE_ENABLED:
+                    cache_key = summary_cache_key(
+                        text,
+                        settings.get('length', 'medium'),
+                        settings.get('style', 'paragraph'),
+                        settings.get('userQuery'),
+                        settings['compressionRatio']
+                    )
+                    if settings.get('bypassCache'):
+                        summary_cache.record_bypass()
+                    else:
+                        cached = await summary_cache.get(cache_key)
+
+                if cached is not None:
+                    summary = cached
+                    yield sse_event("token", {"fileName": file.filename, "text": summary})
+                else:
+                    parts = []
+                    async for event in stream_generation(file.filename, text, settings, parts):
+                        yield event
+                    summary = "".join(parts).strip()
+                    if cache_key:
+                        await summary_cache.put(cache_key, summary, SUMMARY_MODEL)
+
+                if user_id:
+                    try:
+                        await save_summary(user_id, file.filename, text, summary, settings)
+                    except Exception as db_error:
+                        logger.error(f"Database error: {str(db_error)}")
+
+                successful += 1
+                done = {"fileName": file.filename, "summary": summary, "cached": cached is not None}
+                document_id = await query_document_id(text, settings)
+                if document_id:
+                    done["documentId"] = document_id
+                yield sse_event("file_done", done)
+
+            except HTTPException as he:
+                logger.error(f"HTTP error streaming {file.filename}: {he.detail}")
+                yield sse_event("error", {"fileName": file.filename, "error": he.detail})
+            except Exception as e:
+                logger.error(f"Unexpected error streaming {file.filename}: {str(e)}")
+                yield sse_event("error", {"fileName": file.filename, "error": f"Unexpected error: {str(e)}"})
+
+        yield sse_event("done", {"total": len(files), "successful": successful})
+    finally:
+        for file in files:
+            file.file.close()
+
+@router.post("/summarize/stream")
+async def summarize_files_stream(
+    files: List[UploadFile] = File(...),
+    settings_json: Optional[str] = Form(None),
+    user_id: Optional[int] = Form(None)
+):
+    """Streaming variant of /summarize: progress events, then summary tokens as they are generated"""
+    logger.info(f"Received streaming summarization request for {len(files)} file(s)")
+    
+    settings = parse_settings(settings_json)
+    
+    detached = [await run_in_threadpool(detach_upload, file) for file in files]
+    return StreamingResponse(
+        stream_summaries(detached, settings, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/query")
+async def summarize_query(
+    request: Request,
+    document_id: str = Form(...),
+    query: str = Form(...),
+    settings_json: Optional[str] = Form(None),
+    file_name: Optional[str] = Form(None),
+    user_id: Optional[int] = Form(None)
+):
+    """Follow-up question on a previously summarized document, answered from its stored chunk index"""
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    
+    settings = parse_settings(settings_json)
+    settings['userQuery'] = query
+    length = settings.get('length', 'medium')
+    style = settings.get('style', 'paragraph')
+    
+    document_index = await index_store.load(document_id)
+    budget = summarizer.final_input_budget(length, style, query)
+    context = await index_store.relevant_text(document_index, query, budget)
+    
+    async def produce():
+        return await summarizer.map_reduce_summarize(context, length, style, query, generate=call_ollama)
+    
+    cache_key = summary_cache_key(context, length, style, query)
+    summary = await cancel_on_disconnect(request, cached_summary(cache_key, produce, bool(settings.get('bypassCache'))))
+    
+    if user_id:
+        try:
+            await save_summary(user_id, file_name or document_id, context, summary, settings)
+        except Exception as db_error:
+            logger.error(f"Database error: {str(db_error)}")
+    
+    return {"documentId": document_id, "fileName": file_name, "summary": summary}
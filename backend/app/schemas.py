@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, EmailStr
+from typing import List, Optional
 from datetime import datetime
 
 class UserCreate(BaseModel):
@@ -49,4 +49,50 @@ class ImageAnalysisRequest(BaseModel):
 
 class ImageAnalysisResponse(BaseModel):
     analysis: str
-    story: Optional[str] = None
\ No newline at end of file
+    story: Optional[str] = None
+
+class SummaryHistoryItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    file_name: Optional[str] = None
+    summary_length: Optional[str] = None
+    summary_style: Optional[str] = None
+    user_prompt: Optional[str] = None
+    preview: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class SummaryDetail(SummaryHistoryItem):
+    original_text: Optional[str] = None
+    summary_text: Optional[str] = None
+
+class SummaryHistoryPage(BaseModel):
+    items: List[SummaryHistoryItem]
+    next_cursor: Optional[str] = None
+
+class ImageAnalysisHistoryItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    image_name: Optional[str] = None
+    preview: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class ImageAnalysisDetail(ImageAnalysisHistoryItem):
+    analysis_text: Optional[str] = None
+    story_text: Optional[str] = None
+
+class ImageAnalysisHistoryPage(BaseModel):
+    items: List[ImageAnalysisHistoryItem]
+    next_cursor: Optional[str] = None
+
+class SearchResult(BaseModel):
+    kind: str  # summary, image
+    id: int
+    title: Optional[str] = None
+    snippet: Optional[str] = None
+    rank: float
+    created_at: Optional[datetime] = None
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
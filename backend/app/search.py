@@ -0,0 +1,178 @@
+"""
+Full-text search over a user's summaries and image analyses.
+
+PostgreSQL: each table gets a stored generated tsvector column (file/image
+name weighted above the body) with a GIN index, so the database keeps the
+index in sync on every insert and update. Results are ranked with ts_rank
+and snippets come from ts_headline, computed only for the returned page.
+
+SQLite: one FTS5 virtual table, history_fts, holds both kinds of records.
+crud's create and bulk-create functions add rows to it in the same
+transaction as the records. Results are ranked with bm25 and highlighted
+with snippet().
+
+Either way the query is answered from the index, never by scanning
+summary_text with LIKE.
+"""
+import logging
+import re
+from typing import List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SEARCH_KINDS = ("summary", "image")
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+_POSTGRES_SCHEMA = [
+    """ALTER TABLE summaries ADD COLUMN IF NOT EXISTS search_vector tsvector
+       GENERATED ALWAYS AS (
+           setweight(to_tsvector('english', coalesce(file_name, '')), 'A') ||
+           setweight(to_tsvector('english', coalesce(user_prompt, '')), 'B') ||
+           setweight(to_tsvector('english', coalesce(summary_text, '')), 'B')
+       ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_summaries_search_vector ON summaries USING GIN (search_vector)",
+    """ALTER TABLE image_analyses ADD COLUMN IF NOT EXISTS search_vector tsvector
+       GENERATED ALWAYS AS (
+           setweight(to_tsvector('english', coalesce(image_name, '')), 'A') ||
+           setweight(to_tsvector('english', coalesce(analysis_text, '')), 'B') ||
+           setweight(to_tsvector('english', coalesce(story_text, '')), 'C')
+       ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_image_analyses_search_vector ON image_analyses USING GIN (search_vector)",
+]
+
+_SQLITE_CREATE = """CREATE VIRTUAL TABLE history_fts USING fts5(
+    title, body,
+    kind UNINDEXED, record_id UNINDEXED, user_id UNINDEXED, created_at UNINDEXED,
+    tokenize = 'porter unicode61'
+)"""
+
+_SQLITE_INDEX_SUMMARIES = """INSERT INTO history_fts (title, body, kind, record_id, user_id, created_at)
+    SELECT file_name, coalesce(user_prompt, '') || ' ' || coalesce(summary_text, ''),
+           'summary', id, user_id, created_at FROM summaries"""
+
+_SQLITE_INDEX_IMAGES = """INSERT INTO history_fts (title, body, kind, record_id, user_id, created_at)
+    SELECT image_name, coalesce(analysis_text, '') || ' ' || coalesce(story_text, ''),
+           'image', id, user_id, created_at FROM image_analyses"""
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+def ensure_search_index(engine: Engine):
+    """Create the full-text index for this database if it does not exist yet"""
+    dialect = _dialect(engine)
+    if dialect not in ("postgresql", "sqlite"):
+        raise ValueError(f"History search needs PostgreSQL or SQLite; DATABASE_URL points at {dialect}")
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            for statement in _POSTGRES_SCHEMA:
+                conn.execute(text(statement))
+        else:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'")
+            ).first()
+            if not exists:
+                conn.execute(text(_SQLITE_CREATE))
+                # Index records written before search existed
+                conn.execute(text(_SQLITE_INDEX_SUMMARIES))
+                conn.execute(text(_SQLITE_INDEX_IMAGES))
+                logger.info("Created FTS5 search index")
+
+
+def _index_sqlite(db: Session, statement: str, ids: List[int]):
+    if ids:
+        db.execute(text(f"{statement} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                   {"ids": list(ids)})
+
+
+def index_summaries(db: Session, ids: List[int]):
+    """Add freshly inserted summaries to the search index (PostgreSQL maintains its generated column itself)"""
+    if _dialect(db.get_bind()) == "sqlite":
+        _index_sqlite(db, _SQLITE_INDEX_SUMMARIES, ids)
+
+
+def index_image_analyses(db: Session, ids: List[int]):
+    if _dialect(db.get_bind()) == "sqlite":
+        _index_sqlite(db, _SQLITE_INDEX_IMAGES, ids)
+
+
+def search_terms(query: str) -> List[str]:
+    return _TERM.findall(query.lower())
+
+
+def _fts5_query(terms: List[str]) -> str:
+    # Quote every term so user input cannot inject FTS5 syntax; the last one matches as a prefix
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _search_sqlite(db: Session, user_id: int, terms: List[str], kind: Optional[str], limit: int) -> List[dict]:
+    rows = db.execute(
+        text(f"""SELECT kind, record_id, title, created_at,
+                        snippet(history_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 16) AS snippet,
+                        bm25(history_fts, 4.0, 1.0) AS score
+                 FROM history_fts
+                 WHERE history_fts MATCH :query AND user_id = :user_id
+                   AND (:kind IS NULL OR kind = :kind)
+                 ORDER BY score
+                 LIMIT :limit"""),
+        {"query": _fts5_query(terms), "user_id": user_id, "kind": kind, "limit": limit},
+    ).mappings().all()
+    # bm25 is lower-is-better; flip it so larger rank means more relevant on both backends
+    return [{**row, "rank": -row["score"]} for row in rows]
+
+
+def _search_postgres(db: Session, user_id: int, terms: List[str], kind: Optional[str], limit: int) -> List[dict]:
+    tsquery = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+    options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=35, MinWords=15"
+    rows = db.execute(
+        text(f"""WITH q AS (SELECT to_tsquery('english', :tsquery) AS query),
+                 hits AS (
+                     SELECT 'summary' AS kind, id AS record_id, file_name AS title, created_at,
+                            summary_text AS body, ts_rank(search_vector, q.query) AS rank
+                     FROM summaries, q
+                     WHERE user_id = :user_id AND search_vector @@ q.query
+                       AND (CAST(:kind AS TEXT) IS NULL OR :kind = 'summary')
+                     UNION ALL
+                     SELECT 'image', id, image_name, created_at,
+                            analysis_text, ts_rank(search_vector, q.query)
+                     FROM image_analyses, q
+                     WHERE user_id = :user_id AND search_vector @@ q.query
+                       AND (CAST(:kind AS TEXT) IS NULL OR :kind = 'image')
+                     ORDER BY rank DESC
+                     LIMIT :limit
+                 )
+                 SELECT kind, record_id, title, created_at, rank,
+                        ts_headline('english', body, q.query, '{options}') AS snippet
+                 FROM hits, q
+                 ORDER BY rank DESC"""),
+        {"tsquery": tsquery, "user_id": user_id, "kind": kind, "limit": limit},
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def search_history(db: Session, user_id: int, query: str, kind: Optional[str] = None, limit: int = 20) -> List[dict]:
+    """Ranked matches with highlighted snippets"""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    # ensure_search_index has already rejected any other database at start-up
+    if _dialect(db.get_bind()) == "postgresql":
+        return _search_postgres(db, user_id, terms, kind, limit)
+    return _search_sqlite(db, user_id, terms, kind, limit)
+
+
+async def search_history_async(db: AsyncSession, user_id: int, query: str, kind: Optional[str] = None,
+                               limit: int = 20) -> List[dict]:
+    # Dialect-specific SQL lives in the sync functions; run_sync executes them on the async connection
+    return await db.run_sync(search_history, user_id, query, kind, limit)
@@ -0,0 +1,64 @@
+"""
+Single-flight coalescing for identical in-flight LLM generations.
+
+The first caller for a key starts the work as a task; callers that arrive
+while it is running await the same task instead of starting their own.
+Each waiter awaits through asyncio.shield, so cancelling one waiter (for
+example on client disconnect) leaves the generation running for the others.
+The task is only cancelled once every waiter has gone away.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls that share a key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self.counters = {"started": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None or call.abandoned:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self.counters["started"] += 1
+        else:
+            self.counters["coalesced"] += 1
+            logger.info(f"[{self.name}] joining in-flight generation ({call.waiters} waiting)")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left to receive the result
+                call.abandoned = True
+                call.task.cancel()
+                self.counters["abandoned"] += 1
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": self.in_flight()}
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,255 @@
+"""
+Prompt building and hierarchical (map-reduce) summarization.
+
+Documents that fit in a single prompt are summarized in one call. Longer
+documents are split into overlapping chunks that are summarized in parallel
+(map), then the partial summaries are merged in groups of SUMMARY_REDUCE_FAN_IN
+(reduce) until they fit into the final prompt. Sizes are token budgets from
+prompt_budget, and every call uses the model's one fixed num_ctx. Every
+call has a bounded input (one chunk or one group) and a bounded output
+(num_predict), so the depth of the reduce tree, and with enough concurrency
+the latency, grows with log(document size) instead of linearly.
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional
+
+from . import prompt_budget
+
+logger = logging.getLogger(__name__)
+
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("SUMMARY_CHUNK_OVERLAP_TOKENS", "100"))
+MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+REDUCE_FAN_IN = int(os.getenv("SUMMARY_REDUCE_FAN_IN", "6"))
+PARTIAL_SUMMARY_WORDS = int(os.getenv("SUMMARY_PARTIAL_WORDS", "150"))
+
+# Bump whenever a prompt below changes, so cached summaries are not reused
+PROMPT_TEMPLATE_VERSION = "3"
+
+LENGTH_TOKENS = {
+    "short": "100-150 words",
+    "medium": "250-300 words",
+    "long": "500-600 words"
+}
+
+STYLE_INSTRUCTIONS = {
+    "paragraph": "Write in clear, flowing paragraphs.",
+    "bullet": "Use bullet points with • symbol. Start each point on a new line.",
+    "flashcard": "Format as Q&A flashcards. Use 'Q:' and 'A:' prefixes.",
+    "mindmap": "Create a hierarchical structure with main topics and subtopics using indentation.",
+    "keypoints": "List the key points numbered 1, 2, 3, etc."
+}
+
+# Partial summaries are intermediate results, so cap their output size.
+# Roughly 1.5 tokens per word leaves headroom for the model to finish a sentence.
+PARTIAL_OPTIONS = {
+    'temperature': 0.3,
+    'num_predict': int(PARTIAL_SUMMARY_WORDS * 1.5) + 64,
+}
+
+Generate = Callable[..., Awaitable[str]]
+Progress = Optional[Callable[[str, int, int], None]]
+
+
+def build_summary_prompt(text: str, length: str, style: str, user_prompt: str = None,
+                         from_sections: bool = False) -> str:
+    """Build the final summary prompt for the requested length and style"""
+    if from_sections:
+        header = ("The following are summaries of consecutive sections of one long document. "
+                  "Combine them into a single coherent summary of the whole document.")
+        label = "Section summaries:"
+    else:
+        header = "Summarize the following text."
+        label = "Text to summarize:"
+
+    return f"""{header}
+Length: {LENGTH_TOKENS.get(length, '250-300 words')}
+Style: {STYLE_INSTRUCTIONS.get(style, 'Write in clear paragraphs.')}
+{f'Additional instructions: {user_prompt}' if user_prompt else ''}
+
+{label}
+{text}
+
+Summary:"""
+
+
+def build_partial_prompt(chunk: str, index: int, total: int, user_prompt: str = None) -> str:
+    """Build the map-stage prompt for one chunk of a long document"""
+    return f"""You are summarizing part {index + 1} of {total} of a long document.
+Write a dense, factual summary of this part in at most {PARTIAL_SUMMARY_WORDS} words.
+Keep names, numbers, dates and conclusions. Do not add an introduction.
+{f'Pay particular attention to: {user_prompt}' if user_prompt else ''}
+
+Part {index + 1}:
+{chunk}
+
+Summary of part {index + 1}:"""
+
+
+def build_combine_prompt(sections: List[str]) -> str:
+    """Build the reduce-stage prompt that merges several partial summaries"""
+    joined = "\n\n".join(f"[{i + 1}] {s}" for i, s in enumerate(sections))
+    return f"""The following are summaries of consecutive sections of one document.
+Merge them into a single dense summary of at most {PARTIAL_SUMMARY_WORDS} words.
+Keep the most important facts, names, numbers and conclusions, in document order.
+
+Section summaries:
+{joined}
+
+Merged summary:"""
+
+
+def split_into_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """Split text into overlapping chunks of chunk_size characters, preferring paragraph and sentence boundaries"""
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text] if text else []
+
+    chunks = []
+    start = 0
+    total = len(text)
+    while start < total:
+        end = min(start + chunk_size, total)
+        if end < total:
+            # Cut at the last natural boundary in the final fifth of the window
+            boundary_floor = start + (chunk_size * 4) // 5
+            for separator in ("\n\n", "\n", ". "):
+                cut = text.rfind(separator, boundary_floor, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= total:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def group_sections(sections: List[str], max_chars: int, fan_in: int = REDUCE_FAN_IN) -> List[List[str]]:
+    """
+    Group consecutive partial summaries so each group fits one reduce call.
+    Every group but the last takes at least two sections, so each reduce
+    round shrinks the list even when sections overrun max_chars.
+    """
+    fan_in = max(2, fan_in)
+    groups = []
+    current = []
+    current_chars = 0
+    for section in sections:
+        if len(current) >= fan_in or (len(current) >= 2 and current_chars + len(section) > max_chars):
+            groups.append(current)
+            current = []
+            current_chars = 0
+        current.append(section)
+        current_chars += len(section)
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _generate_all(generate: Generate, prompts: List[str], options: dict, max_concurrency: int,
+                        on_done: Callable[[], None] = None) -> List[str]:
+    """Run prompts through the model with at most max_concurrency concurrent calls, keeping order"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(prompt):
+        call_options = {**options, **prompt_budget.call_options(prompt, options['num_predict'])}
+        async with semaphore:
+            result = await generate(prompt, options=call_options)
+        if on_done:
+            on_done()
+        return result
+
+    return list(await asyncio.gather(*(run(prompt) for prompt in prompts)))
+
+
+async def condense_text(text: str, generate: Generate, max_tokens: int, user_prompt: str = None,
+                        max_concurrency: int = MAX_CONCURRENCY,
+                        on_progress: Progress = None) -> Optional[List[str]]:
+    """
+    Reduce a long document to section summaries that fit in max_tokens.
+    Returns None when the text already fits and no condensing was needed.
+    on_progress(stage, completed, total) is called as each map/reduce call finishes.
+    """
+    if prompt_budget.fits(text, max_tokens):
+        return None
+
+    num_predict = PARTIAL_OPTIONS['num_predict']
+    chunk_tokens = min(CHUNK_TOKENS, prompt_budget.input_budget(build_partial_prompt("", 0, 1, user_prompt), num_predict))
+    # The merged sections must fit both a reduce call and the final prompt
+    group_tokens = min(prompt_budget.input_budget(build_combine_prompt([]), num_predict), max_tokens)
+    if chunk_tokens <= 0 or group_tokens < 2 * num_predict:
+        raise ValueError(
+            f"A {prompt_budget.num_ctx(prompt_budget.SUMMARY_MODEL)}-token context cannot hold two "
+            f"{num_predict}-token partial summaries plus the prompt; raise MODEL_CONTEXT_TOKENS or "
+            f"MODEL_NUM_CTX for {prompt_budget.SUMMARY_MODEL}, or choose a shorter summary length"
+        )
+    chunks = split_into_chunks(
+        text,
+        prompt_budget.tokens_to_chars(chunk_tokens, text),
+        prompt_budget.tokens_to_chars(CHUNK_OVERLAP_TOKENS, text)
+    )
+    if len(chunks) <= 1:
+        return None
+
+    def tracker(stage: str, total: int):
+        if on_progress is None:
+            return None
+        completed = 0
+
+        def on_done():
+            nonlocal completed
+            completed += 1
+            on_progress(stage, completed, total)
+        return on_done
+
+    logger.info(f"Hierarchical summarization: {len(chunks)} chunks, concurrency {max_concurrency}")
+    prompts = [build_partial_prompt(chunk, i, len(chunks), user_prompt) for i, chunk in enumerate(chunks)]
+    sections = await _generate_all(generate, prompts, PARTIAL_OPTIONS, max_concurrency,
+                                   tracker("map", len(prompts)))
+
+    def group(sections: List[str]) -> List[List[str]]:
+        return group_sections(sections, prompt_budget.tokens_to_chars(group_tokens, "\n\n".join(sections)))
+
+    level = 1
+    groups = group(sections)
+    while len(groups) > 1:
+        logger.info(f"Reduce level {level}: merging {len(sections)} summaries into {len(groups)}")
+        sections = await _generate_all(generate, [build_combine_prompt(g) for g in groups], PARTIAL_OPTIONS,
+                                       max_concurrency, tracker(f"reduce-{level}", len(groups)))
+        groups = group(sections)
+        level += 1
+
+    return sections
+
+
+def final_input_budget(length: str, style: str, user_prompt: str = None) -> int:
+    """Tokens of document text that fit in the final summary prompt"""
+    template = build_summary_prompt("", length, style, user_prompt, from_sections=True)
+    return prompt_budget.input_budget(template, prompt_budget.output_tokens(length))
+
+
+async def build_final_prompt(text: str, length: str, style: str, user_prompt: str, generate: Generate,
+                             max_concurrency: int = MAX_CONCURRENCY, on_progress: Progress = None) -> str:
+    """Condense the document if needed and return the prompt for the final summary call"""
+    sections = await condense_text(text, generate, final_input_budget(length, style, user_prompt), user_prompt,
+                                   max_concurrency, on_progress)
+    if sections is None:
+        return build_summary_prompt(text, length, style, user_prompt)
+    return build_summary_prompt("\n\n".join(sections), length, style, user_prompt, from_sections=True)
+
+
+def final_options(prompt: str, length: str) -> dict:
+    """Context window and output cap for the final summary call"""
+    return prompt_budget.call_options(prompt, prompt_budget.output_tokens(length))
+
+
+async def map_reduce_summarize(text: str, length: str, style: str, user_prompt: str, generate: Generate,
+                               max_concurrency: int = MAX_CONCURRENCY) -> str:
+    """Summarize a document of any size into the requested length and style"""
+    prompt = await build_final_prompt(text, length, style, user_prompt, generate, max_concurrency)
+    return await generate(prompt, options=final_options(prompt, length))
@@ -0,0 +1,141 @@
+"""
+Content-addressed summary cache.
+
+Summaries are keyed on a hash of the extracted text, the summary settings,
+the model name and the prompt template version. Lookups go through a small
+in-process LRU first and then the summary_cache table, so repeated uploads of
+the same document skip the LLM entirely, across restarts and workers.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from . import crud
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL_SECONDS = int(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MEMORY_ENTRIES = int(os.getenv("SUMMARY_CACHE_MEMORY_ENTRIES", "256"))
+CACHE_DB_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_DB_MAX_ENTRIES", "10000"))
+CACHE_EVICT_EVERY = int(os.getenv("SUMMARY_CACHE_EVICT_EVERY", "50"))
+
+
+def make_cache_key(text: str, length: str, style: str, user_query: Optional[str],
+                   model: str, prompt_version: str, **extra) -> str:
+    """Hash the document and every setting that changes the generated summary"""
+    text_hash = hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+    settings = {
+        "length": length,
+        "style": style,
+        "userQuery": (user_query or "").strip(),
+        "model": model,
+        "promptVersion": prompt_version,
+        **extra,
+    }
+    material = text_hash + json.dumps(settings, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """Two-tier (memory LRU + database) cache with TTL and size-based eviction"""
+
+    def __init__(self, ttl_seconds: int = CACHE_TTL_SECONDS, memory_entries: int = CACHE_MEMORY_ENTRIES,
+                 db_max_entries: int = CACHE_DB_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.db_max_entries = db_max_entries
+        self._memory = OrderedDict()  # key -> (stored_at, summary)
+        self._puts_since_evict = 0
+        self.counters = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "bypasses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+
+    async def get(self, key: str) -> Optional[str]:
+        summary = self._get_memory(key)
+        if summary is not None:
+            self.counters["memory_hits"] += 1
+            return summary
+
+        try:
+            summary = await self._get_db(key)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"Summary cache lookup failed: {str(e)}")
+            summary = None
+
+        if summary is None:
+            self.counters["misses"] += 1
+            return None
+
+        self.counters["db_hits"] += 1
+        self._put_memory(key, summary)
+        return summary
+
+    async def put(self, key: str, summary: str, model: str):
+        self._put_memory(key, summary)
+        self.counters["stores"] += 1
+        self._puts_since_evict += 1
+        evict = self._puts_since_evict >= CACHE_EVICT_EVERY
+        if evict:
+            self._puts_since_evict = 0
+        try:
+            await self._put_db(key, summary, model, evict)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"Summary cache store failed: {str(e)}")
+
+    def record_bypass(self):
+        self.counters["bypasses"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.counters["memory_hits"] + self.counters["db_hits"] + self.counters["misses"]
+        hits = self.counters["memory_hits"] + self.counters["db_hits"]
+        return {
+            **self.counters,
+            "memory_entries": len(self._memory),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        item = self._memory.get(key)
+        if item is None:
+            return None
+        stored_at, summary = item
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return summary
+
+    def _put_memory(self, key: str, summary: str):
+        self._memory[key] = (time.monotonic(), summary)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def _get_db(self, key: str) -> Optional[str]:
+        async with AsyncSessionLocal() as db:
+            entry = await crud.get_cached_summary_async(db, key, self.ttl_seconds)
+            return entry.summary_text if entry else None
+
+    async def _put_db(self, key: str, summary: str, model: str, evict: bool):
+        async with AsyncSessionLocal() as db:
+            await crud.store_cached_summary_async(db, key, model, summary)
+            if evict:
+                removed = await crud.evict_summary_cache_async(db, self.ttl_seconds, self.db_max_entries)
+                self.counters["evictions"] += removed
+
+summary_cache = SummaryCache()
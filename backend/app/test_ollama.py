@@ -4,7 +4,6 @@ Test script to verify Ollama is working correctly
 Run this before starting the backend server
 """
 
-import ollama
 import requests
 import sys
 
@@ -66,13 +65,14 @@ def test_summarization():
     
     try:
         print("📝 Generating summary...")
-        response = ollama.generate(
-            model='llama3.2:3b',
-            prompt=f"Summarize the following text in 2-3 sentences:\n\n{test_text}\n\nSummary:",
-            options={
+        response = requests.post("http://localhost:11434/api/generate", json={
+            'model': 'llama3.2:3b',
+            'prompt': f"Summarize the following text in 2-3 sentences:\n\n{test_text}\n\nSummary:",
+            'stream': False,
+            'options': {
                 'temperature': 0.7,
             }
-        )
+        }, timeout=300).json()
         
         if response and 'response' in response:
             summary = response['response']
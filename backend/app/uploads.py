@@ -0,0 +1,50 @@
+"""
+Request helpers shared by the summarize, image and jobs routers: form
+settings parsing, detaching uploads from the request, and server-sent event
+framing.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from fastapi import UploadFile
+
+from .compression import parse_ratio
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", str(1024 * 1024)))
+
+
+def parse_settings(settings_json: Optional[str]) -> dict:
+    """Merge the client's settings JSON over the defaults"""
+    settings = {"length": "medium", "style": "paragraph", "userQuery": ""}
+
+    if settings_json:
+        try:
+            settings.update(json.loads(settings_json))
+            logger.info(f"Settings: {settings}")
+        except Exception as e:
+            logger.warning(f"Error parsing settings: {e}")
+
+    settings['compressionRatio'] = parse_ratio(settings.get('compressionRatio'))
+    return settings
+
+
+def detach_upload(file: UploadFile) -> UploadFile:
+    """
+    Copy an upload into a spool we own. FastAPI closes request files as soon as
+    the endpoint returns, before a streaming response body has been produced.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY)
+    file.file.seek(0)
+    shutil.copyfileobj(file.file, spool)
+    spool.seek(0)
+    return UploadFile(file=spool, filename=file.filename, headers=file.headers)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,64 @@
+"""
+Scheduler for vision-model (LLaVA) calls.
+
+A vision generation holds most of the GPU, so running more of them at once
+than the host can fit only adds queueing inside Ollama and risks evicting
+the model. Every LLaVA call in this worker takes a slot here first, capped
+at VISION_MAX_CONCURRENCY per Ollama host in the backend pool, and waiting
+calls are admitted in arrival order.
+Calls pass VISION_KEEP_ALIVE, when set, so Ollama keeps the model loaded
+between items of a batch; otherwise the backend pool picks keep_alive from
+recent traffic.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from . import metrics
+from .backend_pool import OLLAMA_HOSTS
+
+VISION_MAX_CONCURRENCY = int(os.getenv("VISION_MAX_CONCURRENCY", "2"))
+VISION_KEEP_ALIVE = os.getenv("VISION_KEEP_ALIVE")
+
+
+class VisionScheduler:
+    def __init__(self, max_concurrency: int = VISION_MAX_CONCURRENCY * len(OLLAMA_HOSTS),
+                 keep_alive: Optional[str] = VISION_KEEP_ALIVE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.keep_alive = keep_alive
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        queued = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        metrics.observe_queue_wait("vision", time.perf_counter() - queued)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "keep_alive": self.keep_alive or "auto",
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+        }
+
+
+vision_scheduler = VisionScheduler()
+metrics.track_queue("vision", depth=lambda: vision_scheduler.waiting, in_flight=lambda: vision_scheduler.in_flight)
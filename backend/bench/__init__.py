@@ -0,0 +1 @@
+"""Benchmark harness: fake Ollama server, synthetic corpus and load scenarios."""
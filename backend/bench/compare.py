@@ -0,0 +1,67 @@
+"""
+Compare two bench.run reports, e.g. the base branch and a change.
+
+    python -m bench.compare bench_results/base.json bench_results/head.json --fail-over 10
+
+Prints each scenario and concurrency level with the relative change in
+latency percentiles, throughput and peak RSS. With --fail-over, exits
+non-zero when p95 latency grows (or requests/sec drops) by more than that
+many percent anywhere.
+"""
+import argparse
+import json
+import sys
+from typing import Optional
+
+# (metric, higher is better)
+METRICS = (("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("rps", True), ("peak_rss_mb", False))
+
+
+def change(base: Optional[float], head: Optional[float]) -> Optional[float]:
+    if base in (None, 0) or head is None:
+        return None
+    return (head - base) / base * 100
+
+
+def load(path: str):
+    with open(path, encoding="utf-8") as handle:
+        report = json.load(handle)
+    return {(r["scenario"], r["concurrency"]): r for r in report["results"]}, report["meta"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two benchmark reports")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--fail-over", type=float, help="Fail on a p95 or rps regression above this percent")
+    args = parser.parse_args()
+
+    base, base_meta = load(args.base)
+    head, head_meta = load(args.head)
+    print(f"base {str(base_meta.get('commit'))[:12]}  ->  head {str(head_meta.get('commit'))[:12]}")
+    print(f"{'scenario':<22}{'conc':>5}" + "".join(f"{metric:>26}" for metric, _ in METRICS))
+
+    regressions = []
+    for key in sorted(set(base) & set(head)):
+        row = f"{key[0]:<22}{key[1]:>5}"
+        for metric, higher_is_better in METRICS:
+            before, after = base[key].get(metric), head[key].get(metric)
+            delta = change(before, after)
+            shown = f"{before} -> {after}" + (f" ({delta:+.1f}%)" if delta is not None else "")
+            row += f"{shown:>26}"
+            if args.fail_over is not None and delta is not None and metric in ("p95_ms", "rps"):
+                worse = -delta if higher_is_better else delta
+                if worse > args.fail_over:
+                    regressions.append(f"{key[0]} @ {key[1]}: {metric} {delta:+.1f}%")
+        print(row)
+
+    for key in sorted(set(base) ^ set(head)):
+        print(f"{key[0]} @ {key[1]} is only in the {'base' if key in base else 'head'} report")
+
+    if regressions:
+        print("\nRegressions over threshold:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
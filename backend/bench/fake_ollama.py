@@ -0,0 +1,182 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarking without a GPU.
+
+Implements the endpoints the backend uses (/api/generate with and without
+streaming, /api/embeddings, /api/tags, /api/ps). Each generation waits for
+one of --parallel slots, like OLLAMA_NUM_PARALLEL, then spends time in
+prefill (prompt tokens / --prefill-tps) and decode (output tokens /
+--decode-tps). Responses carry the same eval_count, eval_duration,
+prompt_eval_count and prompt_eval_duration fields as real Ollama. A
+generate request without a prompt only loads the model and returns at once.
+
+    python -m bench.fake_ollama --port 11500 --decode-tps 40 --output-tokens 200
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeOllamaConfig:
+    def __init__(self, latency_ms: float = 20, prefill_tps: float = 2000, decode_tps: float = 40,
+                 output_tokens: int = 200, parallel: int = 4, image_tokens: int = 576,
+                 embedding_dim: int = 768, models: str = "llama3.2:3b,llava:7b,nomic-embed-text"):
+        self.latency_ms = latency_ms
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.output_tokens = output_tokens
+        self.parallel = parallel
+        self.image_tokens = image_tokens
+        self.embedding_dim = embedding_dim
+        self.models = [m for m in models.split(",") if m]
+
+    def as_dict(self) -> dict:
+        return {key: value for key, value in vars(self).items()}
+
+
+config = FakeOllamaConfig()
+app = FastAPI(title="Fake Ollama")
+
+_WORDS = "the document reports results risks costs revenue plans growth teams markets customers".split()
+_slots: Optional[asyncio.Semaphore] = None
+stats = {"generate": 0, "stream": 0, "load": 0, "embeddings": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(1, config.parallel))
+    return _slots
+
+
+def prompt_tokens(body: dict) -> int:
+    # Roughly 4 characters per token, plus a fixed token count per attached image
+    return max(1, len(body.get("prompt", "")) // 4) + config.image_tokens * len(body.get("images") or [])
+
+
+def output_tokens(body: dict) -> int:
+    num_predict = (body.get("options") or {}).get("num_predict")
+    if num_predict and num_predict > 0:
+        return min(config.output_tokens, num_predict)
+    return config.output_tokens
+
+
+def _timing_fields(prompt_count: int, prefill_seconds: float, eval_count: int, decode_seconds: float,
+                   started: float) -> dict:
+    return {
+        "total_duration": int((time.perf_counter() - started) * 1e9),
+        "load_duration": 0,
+        "prompt_eval_count": prompt_count,
+        "prompt_eval_duration": int(prefill_seconds * 1e9),
+        "eval_count": eval_count,
+        "eval_duration": int(decode_seconds * 1e9),
+    }
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": model, "model": model, "size": 0} for model in config.models]}
+
+
+@app.get("/api/ps")
+async def running_models():
+    return {"models": [{"name": model, "model": model, "expires_at": "2099-01-01T00:00:00Z"} for model in config.models]}
+
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    stats["embeddings"] += 1
+    await asyncio.sleep(config.latency_ms / 1000)
+    digest = hashlib.sha256(body.get("prompt", "").encode("utf-8")).digest()
+    rng = random.Random(digest)
+    return {"embedding": [rng.uniform(-1, 1) for _ in range(config.embedding_dim)]}
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    if model not in config.models:
+        return JSONResponse(status_code=404, content={"error": f"model '{model}' not found, try pulling it first"})
+    if "prompt" not in body and not body.get("images"):
+        # A request without a prompt only loads the model, as the backend's warm-up does
+        stats["load"] += 1
+        return {"model": model, "response": "", "done": True, "done_reason": "load", "load_duration": 0}
+
+    prompt_count = prompt_tokens(body)
+    eval_count = output_tokens(body)
+    prefill_seconds = prompt_count / config.prefill_tps
+    decode_seconds = eval_count / config.decode_tps
+    rng = random.Random(prompt_count)
+    words = [rng.choice(_WORDS) for _ in range(eval_count)]
+
+    if not body.get("stream", True):
+        stats["generate"] += 1
+        started = time.perf_counter()
+        async with _get_slots():
+            await asyncio.sleep(config.latency_ms / 1000 + prefill_seconds + decode_seconds)
+        stats["prompt_tokens"] += prompt_count
+        stats["output_tokens"] += eval_count
+        return {
+            "model": model,
+            "response": " ".join(words),
+            "done": True,
+            **_timing_fields(prompt_count, prefill_seconds, eval_count, decode_seconds, started),
+        }
+
+    async def stream():
+        stats["stream"] += 1
+        started = time.perf_counter()
+        async with _get_slots():
+            await asyncio.sleep(config.latency_ms / 1000 + prefill_seconds)
+            # Sleep per batch of tokens rather than per token to keep the stand-in itself cheap
+            batch = max(1, math.ceil(config.decode_tps / 20))
+            for start in range(0, eval_count, batch):
+                chunk = words[start:start + batch]
+                await asyncio.sleep(len(chunk) / config.decode_tps)
+                yield json.dumps({"model": model, "response": " ".join(chunk) + " ", "done": False}) + "\n"
+        stats["prompt_tokens"] += prompt_count
+        stats["output_tokens"] += eval_count
+        final = {"model": model, "response": "", "done": True,
+                 **_timing_fields(prompt_count, prefill_seconds, eval_count, decode_seconds, started)}
+        yield json.dumps(final) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/bench/stats")
+async def bench_stats():
+    """Calls and tokens served so far, read by the benchmark runner"""
+    return {**stats, "config": config.as_dict()}
+
+
+def main():
+    global config
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms, help="Fixed overhead per call")
+    parser.add_argument("--prefill-tps", type=float, default=config.prefill_tps, help="Prompt tokens per second")
+    parser.add_argument("--decode-tps", type=float, default=config.decode_tps, help="Generated tokens per second")
+    parser.add_argument("--output-tokens", type=int, default=config.output_tokens)
+    parser.add_argument("--parallel", type=int, default=config.parallel, help="Concurrent generations")
+    parser.add_argument("--image-tokens", type=int, default=config.image_tokens)
+    parser.add_argument("--models", default=",".join(config.models))
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(args.latency_ms, args.prefill_tps, args.decode_tps, args.output_tokens,
+                              args.parallel, args.image_tokens, config.embedding_dim, args.models)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
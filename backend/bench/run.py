@@ -0,0 +1,347 @@
+"""
+Load scenarios against a locally started backend and fake Ollama.
+
+Starts bench.fake_ollama and the FastAPI app (uvicorn, SQLite in a temp
+directory, caches off by default), generates a corpus, then drives each
+scenario closed-loop at every concurrency level: `concurrency` clients
+each send their next request as soon as the previous one returns. Writes
+a JSON report with p50/p95/p99 latency, requests/sec, errors, LLM calls
+and the backend's peak RSS, keyed by scenario and concurrency so that
+bench.compare can diff two commits.
+
+    cd backend
+    python -m bench.run --scenarios summarize-txt,image --concurrency 1,4,16 --requests 32
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from . import corpus
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY_TIMEOUT = 60.0
+RSS_SAMPLE_INTERVAL = 0.05
+
+
+class Scenario:
+    def __init__(self, endpoint: str, kind: str, size: str, data: Optional[dict] = None):
+        self.endpoint = endpoint
+        self.kind = kind
+        self.size = size
+        self.data = data or {}
+
+    def request(self, name: str, content: bytes):
+        """(path, files, data) for one upload"""
+        upload = (name, content, corpus.MIME_TYPES[self.kind])
+        if self.endpoint == "summarize":
+            settings = {"length": "medium", "style": "paragraph", **self.data}
+            return "/summarize/summarize", [("files", upload)], {"settings_json": json.dumps(settings)}
+        return "/image/analyze-image", {"image": upload}, {k: str(v).lower() for k, v in self.data.items()}
+
+    def succeeded(self, response: httpx.Response) -> bool:
+        if response.status_code != 200:
+            return False
+        if self.endpoint == "summarize":
+            # Per-file failures come back as 200 with an error entry
+            return all("summary" in result for result in response.json())
+        return True
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "summarize-txt": Scenario("summarize", "txt", "medium"),
+    "summarize-pdf": Scenario("summarize", "pdf", "medium"),
+    "summarize-docx": Scenario("summarize", "docx", "medium"),
+    "summarize-xlsx": Scenario("summarize", "xlsx", "medium"),
+    "summarize-large-pdf": Scenario("summarize", "pdf", "large"),
+    "summarize-query": Scenario("summarize", "pdf", "large", {"userQuery": "What risks are identified?"}),
+    "image": Scenario("image", "png", "medium"),
+    "image-story": Scenario("image", "png", "medium", {"generate_story": True}),
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-pct * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """Tracks the peak RSS of a process while a load level runs"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak_mb: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.peak_mb = max(self.peak_mb or 0.0, rss)
+            await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self.peak_mb = read_rss_mb(self.pid)
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+def git_revision() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+
+def start_process(args: List[str], env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url: str, process: subprocess.Popen, log_path: str):
+    deadline = time.monotonic() + READY_TIMEOUT
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                with open(log_path, errors="replace") as handle:
+                    raise RuntimeError(f"{url} exited during startup:\n{handle.read()[-2000:]}")
+            try:
+                if (await client.get(url, timeout=2)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {READY_TIMEOUT:.0f}s")
+
+
+async def run_level(client: httpx.AsyncClient, scenario: Scenario, uploads: List[tuple],
+                    concurrency: int, requests: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while True:
+            index = next(counter)
+            if index >= requests:
+                return
+            name, content = uploads[index % len(uploads)]
+            path, files, data = scenario.request(name, content)
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, files=files, data=data)
+                ok = scenario.succeeded(response)
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "rps": round(len(latencies) / wall, 3) if wall else None,
+        "p50_ms": _round(percentile(latencies, 50)),
+        "p95_ms": _round(percentile(latencies, 95)),
+        "p99_ms": _round(percentile(latencies, 99)),
+        "mean_ms": _round(sum(latencies) / len(latencies) if latencies else None),
+        "max_ms": _round(latencies[-1] if latencies else None),
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def load_uploads(manifest: List[dict], scenario: Scenario, count: int) -> List[tuple]:
+    entries = [e for e in manifest if e["kind"] == scenario.kind and e["size"] == scenario.size][:count]
+    uploads = []
+    for entry in entries:
+        with open(entry["path"], "rb") as handle:
+            uploads.append((entry["name"], handle.read()))
+    return uploads
+
+
+async def run_benchmark(args) -> dict:
+    scenarios = {name: SCENARIOS[name] for name in args.scenarios.split(",")}
+    levels = [int(level) for level in args.concurrency.split(",")]
+    workdir = tempfile.mkdtemp(prefix="documind-bench-")
+
+    corpus_dir = args.corpus_dir or os.path.join(workdir, "corpus")
+    needed = {(s.kind, s.size) for s in scenarios.values()}
+    manifest = []
+    for kind, size in sorted(needed):
+        manifest += corpus.generate(corpus_dir, [kind], [size], args.files, args.seed)
+
+    ollama_port, backend_port = free_port(), free_port()
+    fake_args = [
+        sys.executable, "-m", "bench.fake_ollama", "--port", str(ollama_port),
+        "--latency-ms", str(args.latency_ms), "--prefill-tps", str(args.prefill_tps),
+        "--decode-tps", str(args.decode_tps), "--output-tokens", str(args.output_tokens),
+        "--parallel", str(args.parallel),
+    ]
+    backend_env = {
+        **os.environ,
+        "OLLAMA_HOST": f"http://127.0.0.1:{ollama_port}",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "JOB_STORAGE_DIR": os.path.join(workdir, "job_data"),
+        "EMBEDDING_INDEX_DIR": os.path.join(workdir, "embedding_index"),
+    }
+    if not args.with_cache:
+        backend_env.update({"SUMMARY_CACHE_ENABLED": "false", "IMAGE_CACHE_ENTRIES": "0"})
+    for item in args.env:
+        key, _, value = item.partition("=")
+        backend_env[key] = value
+
+    fake = start_process(fake_args, os.environ.copy(), os.path.join(workdir, "fake_ollama.log"))
+    backend_log = os.path.join(workdir, "backend.log")
+    backend = start_process(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(backend_port), "--log-level", "warning"],
+        backend_env, backend_log
+    )
+    results = []
+    succeeded = False
+    try:
+        await wait_ready(f"http://127.0.0.1:{ollama_port}/api/tags", fake, os.path.join(workdir, "fake_ollama.log"))
+        await wait_ready(f"http://127.0.0.1:{backend_port}/health", backend, backend_log)
+        base_url = f"http://127.0.0.1:{backend_port}"
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client, \
+                httpx.AsyncClient(base_url=f"http://127.0.0.1:{ollama_port}") as ollama:
+            for name, scenario in scenarios.items():
+                uploads = load_uploads(manifest, scenario, args.files)
+                if args.warmup:
+                    await run_level(client, scenario, uploads, 1, args.warmup)
+                for level in levels:
+                    before = (await ollama.get("/bench/stats")).json()
+                    with RssSampler(backend.pid) as rss:
+                        result = await run_level(client, scenario, uploads, level, args.requests)
+                    after = (await ollama.get("/bench/stats")).json()
+                    result.update({
+                        "scenario": name,
+                        "concurrency": level,
+                        "peak_rss_mb": _round(rss.peak_mb),
+                        "llm_calls": sum(after[k] - before[k] for k in ("generate", "stream", "embeddings")),
+                        "llm_output_tokens": after["output_tokens"] - before["output_tokens"],
+                    })
+                    results.append(result)
+                    print(format_row(result), flush=True)
+            fake_config = (await ollama.get("/bench/stats")).json()["config"]
+        succeeded = True
+    finally:
+        for process in (backend, fake):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if succeeded:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"Logs kept in {workdir}", file=sys.stderr)
+
+    return {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fake_ollama": fake_config,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+
+HEADER = f"{'scenario':<22}{'conc':>5}{'ok':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'rss MB':>9}"
+
+
+def format_row(result: dict) -> str:
+    def cell(value, width):
+        return f"{'-' if value is None else value:>{width}}"
+    return (f"{result['scenario']:<22}{result['concurrency']:>5}{result['requests'] - result['errors']:>6}"
+            f"{result['errors']:>5}{cell(result['p50_ms'], 10)}{cell(result['p95_ms'], 10)}"
+            f"{cell(result['p99_ms'], 10)}{cell(result['rps'], 9)}{cell(result['peak_rss_mb'], 9)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run DocuMind load scenarios against a fake Ollama")
+    parser.add_argument("--scenarios", default="summarize-txt,summarize-pdf,image",
+                        help=f"Comma-separated; available: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per scenario and level")
+    parser.add_argument("--warmup", type=int, default=2, help="Sequential requests before each scenario")
+    parser.add_argument("--files", type=int, default=16, help="Distinct documents per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help="Reuse or keep the generated corpus here")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--with-cache", action="store_true", help="Keep the summary and image caches enabled")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra backend environment variable, repeatable")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--prefill-tps", type=float, default=2000)
+    parser.add_argument("--decode-tps", type=float, default=40)
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--out", help="Report path (default bench_results/<commit>.json)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios.split(",") if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    print(HEADER)
+    report = asyncio.run(run_benchmark(args))
+    out = args.out or os.path.join("bench_results", f"{(report['meta']['commit'] or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Report written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cold-start timing for the backend.
+
+Measures, over several fresh processes:
+- import: seconds to `import app.main` in a new interpreter
+- ready: seconds from launching uvicorn until /health answers, against the
+  fake Ollama and an empty SQLite database (so schema setup is included)
+
+Reports medians as JSON, and fails when a median exceeds its
+--max-*-seconds limit, so a start-up regression is caught in CI.
+
+    cd backend
+    python -m bench.startup --repeat 5 --max-import-seconds 2 --max-ready-seconds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .run import BACKEND_DIR, free_port, git_revision, start_process, wait_ready
+
+_IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def measure_import(env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+async def measure_ready(env: dict, workdir: str) -> float:
+    port = free_port()
+    log_path = os.path.join(workdir, f"backend-{port}.log")
+    started = time.perf_counter()
+    backend = start_process(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env, log_path
+    )
+    try:
+        await wait_ready(f"http://127.0.0.1:{port}/health", backend, log_path)
+        return time.perf_counter() - started
+    finally:
+        backend.terminate()
+        backend.wait(timeout=10)
+
+
+async def measure(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="documind-startup-")
+    ollama_port = free_port()
+    fake_log = os.path.join(workdir, "fake_ollama.log")
+    fake = start_process([sys.executable, "-m", "bench.fake_ollama", "--port", str(ollama_port)],
+                         os.environ.copy(), fake_log)
+    imports, ready = [], []
+    try:
+        await wait_ready(f"http://127.0.0.1:{ollama_port}/api/tags", fake, fake_log)
+        for attempt in range(args.repeat):
+            env = {
+                **os.environ,
+                "OLLAMA_HOST": f"http://127.0.0.1:{ollama_port}",
+                # A new database each time, so every start pays for schema setup
+                "DATABASE_URL": f"sqlite:///{os.path.join(workdir, f'startup-{attempt}.db')}",
+                "JOB_STORAGE_DIR": os.path.join(workdir, "job_data"),
+                "EMBEDDING_INDEX_DIR": os.path.join(workdir, "embedding_index"),
+            }
+            imports.append(measure_import(env))
+            ready.append(await measure_ready(env, workdir))
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {**git_revision(), "repeat": args.repeat},
+        "import_seconds": round(statistics.median(imports), 3),
+        "ready_seconds": round(statistics.median(ready), 3),
+        "samples": {"import": [round(s, 3) for s in imports], "ready": [round(s, 3) for s in ready]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend cold-start time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float)
+    parser.add_argument("--max-ready-seconds", type=float)
+    parser.add_argument("--out", help="Also write the report to this path")
+    args = parser.parse_args()
+
+    report = asyncio.run(measure(args))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+    failures = []
+    if args.max_import_seconds is not None and report["import_seconds"] > args.max_import_seconds:
+        failures.append(f"import {report['import_seconds']}s > {args.max_import_seconds}s")
+    if args.max_ready_seconds is not None and report["ready_seconds"] > args.max_ready_seconds:
+        failures.append(f"ready {report['ready_seconds']}s > {args.max_ready_seconds}s")
+    if failures:
+        print("Start-up regression: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
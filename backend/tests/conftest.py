@@ -0,0 +1,31 @@
+"""
+Test settings, applied before any app module reads its environment.
+
+Tests run against a throwaway SQLite database and a small
+EXTRACTION_MAX_CHARS, so truncation is exercised by ordinary fixtures.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="documind-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ["EXTRACTION_MAX_CHARS"] = "20000"
+os.environ["JOB_STORAGE_DIR"] = os.path.join(_workdir, "job_data")
+os.environ["EMBEDDING_INDEX_DIR"] = os.path.join(_workdir, "embedding_index")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Create the schema once; tests clean up the rows they add"""
+    from app.migrations import run_migrations
+
+    run_migrations()
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from fastapi import HTTPException
+
+from app import prompt_budget
+from app.backend_pool import BackendPool
+
+
+def test_warm_up_loads_with_the_generation_num_ctx(monkeypatch):
+    monkeypatch.setattr(prompt_budget, "MODEL_NUM_CTX", {"llava:7b": 4096})
+    pool = BackendPool(["http://ollama.test:11434"])
+    host = pool.hosts[0]
+    host.monitor.last_checked = time.time()
+    loaded, generated = {}, {}
+
+    async def load(model, options=None, **kwargs):
+        loaded[model] = options
+        return {"load_duration": 0}
+
+    async def generate(model, prompt, **kwargs):
+        generated[model] = kwargs["options"]
+        return {"response": "ok"}
+
+    host.client.load = load
+    host.client.generate = generate
+
+    async def run():
+        await pool.warm_up(["llava:7b", "llama3.2:3b"])
+        await pool.generate("llava:7b", "describe")
+        await pool.generate("llama3.2:3b", "summarize")
+        await pool.aclose()
+
+    asyncio.run(run())
+    assert loaded == {"llava:7b": {"num_ctx": 4096}, "llama3.2:3b": {"num_ctx": prompt_budget.MODEL_CONTEXT_TOKENS}}
+    assert loaded == generated
+
+
+def _pool(*names):
+    pool = BackendPool([f"http://{name}:11434" for name in names], max_concurrency=4)
+    for host in pool.hosts:
+        host.monitor.mark_loaded("llama3.2:3b")
+    return pool
+
+
+def test_calls_go_to_the_least_loaded_host():
+    pool = _pool("a", "b", "c")
+    a, b, c = pool.hosts
+    a.client.in_flight, a.client.waiting = 3, 1
+    b.client.in_flight = 1
+    c.client.in_flight = 2
+    assert pool.choose("llama3.2:3b") is b
+    # A cold host is only picked once the warm ones are COLD_HOST_PENALTY busier
+    b.monitor.loaded = []
+    assert pool.choose("llama3.2:3b") is c
+    asyncio.run(pool.aclose())
+
+
+def test_failed_call_is_retried_on_the_next_host():
+    pool = _pool("a", "b")
+    a, b = pool.hosts
+    b.client.in_flight = 1
+    calls = []
+
+    async def unavailable(model, prompt, **kwargs):
+        calls.append(a.url)
+        raise HTTPException(status_code=503, detail="Ollama service is overloaded")
+
+    async def answer(model, prompt, **kwargs):
+        calls.append(b.url)
+        return {"response": "ok"}
+
+    a.client.generate = unavailable
+    b.client.generate = answer
+
+    async def run():
+        try:
+            return await pool.generate("llama3.2:3b", "hello")
+        finally:
+            await pool.aclose()
+
+    assert asyncio.run(run()) == {"response": "ok"}
+    assert calls == [a.url, b.url]
+    assert (a.failures, a.failovers, b.failures) == (1, 1, 0)
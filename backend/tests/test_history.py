@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import text
+
+from app import crud, models
+from app.database import SessionLocal
+from app.routes import auth, history
+
+
+@pytest.fixture
+def client(database):
+    db = SessionLocal()
+    mine = crud.create_summary(db, user_id=7, file_name="mine.txt", original_text="x",
+                               summary_text="My contract summary", length="short", style="bullet")
+    theirs = crud.create_summary(db, user_id=8, file_name="theirs.txt", original_text="y",
+                                 summary_text="Their contract summary", length="short", style="bullet")
+    image = crud.create_image_analysis(db, user_id=8, image_name="theirs.png", analysis_text="A contract on a desk")
+    app = FastAPI()
+    app.include_router(history.router, prefix="/history")
+    with TestClient(app) as test_client:
+        test_client.ids = {"mine": mine.id, "theirs": theirs.id, "image": image.id}
+        yield test_client
+    db.query(models.Summary).delete()
+    db.query(models.ImageAnalysis).delete()
+    # crud indexes new records for search; nothing removes them on delete
+    db.execute(text("DELETE FROM history_fts"))
+    db.commit()
+    db.close()
+
+
+def bearer(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': str(user_id)})}"}
+
+
+def test_history_requires_a_token(client):
+    assert client.get("/history/summaries").status_code == 401
+    assert client.get("/history/images", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+    expired = jwt.encode({"sub": "7", "exp": datetime.utcnow() - timedelta(minutes=1)}, auth.SECRET_KEY,
+                         algorithm=auth.ALGORITHM)
+    assert client.get("/history/summaries", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+
+
+def test_history_uses_the_token_user_not_the_query(client):
+    page = client.get("/history/summaries", params={"user_id": 8}, headers=bearer(7)).json()
+    assert [item["file_name"] for item in page["items"]] == ["mine.txt"]
+    assert client.get("/history/images", params={"user_id": 8}, headers=bearer(7)).json()["items"] == []
+
+
+def test_history_detail_is_scoped_to_the_token_user(client):
+    ids = client.ids
+    assert client.get(f"/history/summaries/{ids['mine']}", headers=bearer(7)).status_code == 200
+    assert client.get(f"/history/summaries/{ids['theirs']}", params={"user_id": 8}, headers=bearer(7)).status_code == 404
+    assert client.get(f"/history/images/{ids['image']}", params={"user_id": 8}, headers=bearer(7)).status_code == 404
+    assert client.get(f"/history/images/{ids['image']}", headers=bearer(8)).status_code == 200
+
+
+def test_search_uses_the_token_user_not_the_query(client):
+    assert client.get("/history/search", params={"q": "contract"}).status_code == 401
+    results = client.get("/history/search", params={"user_id": 8, "q": "contract"}, headers=bearer(7)).json()["results"]
+    assert [(result["kind"], result["title"]) for result in results] == [("summary", "mine.txt")]
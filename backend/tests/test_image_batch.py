@@ -0,0 +1,55 @@
+import asyncio
+import io
+import json
+from types import SimpleNamespace
+
+from app.routes import image_analysis
+
+
+class UnreadableFile(io.BytesIO):
+    def read(self, *args):
+        raise OSError("spool file vanished")
+
+
+def _upload(name: str, fileobj) -> SimpleNamespace:
+    return SimpleNamespace(filename=name, file=fileobj)
+
+
+def _collect(images) -> list:
+    async def run():
+        stream = image_analysis.stream_image_batch(images, False, None, "parallel", None)
+        return [event async for event in stream]
+
+    events = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    parsed = []
+    for event in events:
+        name_line, data_line = event.strip().split("\n")
+        parsed.append((name_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return parsed
+
+
+def test_unreadable_upload_reports_error_and_batch_finishes(monkeypatch):
+    async def fake_analysis(image_data, generate_story, story_prompt, story_mode):
+        return f"{len(image_data)} bytes", None, {}
+
+    monkeypatch.setattr(image_analysis, "analyze_image_data", fake_analysis)
+    events = _collect([_upload("good.png", io.BytesIO(b"png")), _upload("bad.png", UnreadableFile())])
+
+    names = [name for name, _ in events]
+    assert names[0] == "batch_start"
+    assert names[-1] == "done"
+    assert events[-1][1] == {"total": 2, "successful": 1}
+    errors = [data for name, data in events if name == "error"]
+    assert [error["fileName"] for error in errors] == ["bad.png"]
+    assert [data["fileName"] for name, data in events if name == "image_done"] == ["good.png"]
+
+
+def test_batch_failure_ends_the_stream(monkeypatch):
+    async def broken_pipeline(*args, **kwargs):
+        raise RuntimeError("scheduler gone")
+
+    monkeypatch.setattr(image_analysis, "run_pipelined", broken_pipeline)
+    events = _collect([_upload("good.png", io.BytesIO(b"png"))])
+
+    assert [name for name, _ in events] == ["batch_start", "error"]
+    assert "scheduler gone" in events[-1][1]["error"]
@@ -0,0 +1,37 @@
+import io
+
+import pytest
+
+from app.extractors import registry
+from app.ingestion import EXTRACTION_MAX_CHARS
+from bench.corpus import document_bytes
+
+
+@pytest.mark.parametrize("extension, kind", [(".txt", "txt"), (".docx", "docx"), (".xlsx", "xlsx"), (".pdf", "pdf")])
+def test_extraction_stops_at_max_chars(extension, kind):
+    data = document_bytes(kind, "large", seed=1)
+    text = registry.get(f"report{extension}").extract(io.BytesIO(data))
+    assert len(text) == EXTRACTION_MAX_CHARS
+
+
+@pytest.mark.parametrize("extension, kind", [(".txt", "txt"), (".pdf", "pdf")])
+def test_small_documents_are_not_truncated(extension, kind):
+    data = document_bytes(kind, "small", seed=1)
+    text = registry.get(f"report{extension}").extract(io.BytesIO(data))
+    assert 0 < len(text) < EXTRACTION_MAX_CHARS
+
+
+def test_pdf_limit_applies_to_parallel_extraction(monkeypatch):
+    from app import pdf_extraction
+
+    monkeypatch.setattr(pdf_extraction, "PDF_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(pdf_extraction, "PDF_EXTRACTION_WORKERS", 2)
+    monkeypatch.setattr(pdf_extraction, "PDF_PAGES_PER_TASK", 5)
+    data = document_bytes("pdf", "large", seed=1)
+    try:
+        text = pdf_extraction.extract_pdf_text(io.BytesIO(data))
+    finally:
+        pdf_extraction.shutdown_pool()
+    full = pdf_extraction.extract_pdf_text(io.BytesIO(data), max_chars=None)
+    assert len(text) == EXTRACTION_MAX_CHARS
+    assert full.startswith(text)
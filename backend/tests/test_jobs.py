@@ -0,0 +1,124 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import crud, jobs, models
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def db(database):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.query(models.Job).delete()
+        session.commit()
+        session.close()
+
+
+def _running_job(db, attempts: int, max_attempts: int = 3, started_minutes_ago: int = 60) -> str:
+    job_id = str(uuid.uuid4())
+    crud.create_job(db, job_id, "summarize", "report.txt", f"/tmp/jobs/{job_id}/report.txt", {},
+                    max_attempts=max_attempts)
+    db.query(models.Job).filter(models.Job.id == job_id).update({
+        "status": "running",
+        "attempts": attempts,
+        "started_at": datetime.utcnow() - timedelta(minutes=started_minutes_ago),
+    })
+    db.commit()
+    return job_id
+
+
+def test_stale_job_with_attempts_left_is_requeued(db):
+    job_id = _running_job(db, attempts=1)
+    requeued, failed_inputs = crud.requeue_stale_jobs(db, stale_after_seconds=900)
+    db.expire_all()
+    assert (requeued, failed_inputs) == (1, [])
+    assert crud.get_job(db, job_id).status == "queued"
+
+
+def test_stale_job_out_of_attempts_is_failed(db):
+    job_id = _running_job(db, attempts=3, max_attempts=3)
+    requeued, failed_inputs = crud.requeue_stale_jobs(db, stale_after_seconds=900)
+    db.expire_all()
+    job = crud.get_job(db, job_id)
+    assert requeued == 0
+    assert failed_inputs == [f"/tmp/jobs/{job_id}/report.txt"]
+    assert job.status == "failed"
+    assert job.error == crud.STALE_JOB_ERROR
+    assert job.finished_at is not None
+
+
+def test_recently_started_job_is_left_running(db):
+    job_id = _running_job(db, attempts=3, started_minutes_ago=1)
+    assert crud.requeue_stale_jobs(db, stale_after_seconds=900) == (0, [])
+    db.expire_all()
+    assert crud.get_job(db, job_id).status == "running"
+
+
+def test_job_with_a_recent_heartbeat_is_left_running(db):
+    job_id = _running_job(db, attempts=1)
+    crud.heartbeat_jobs(db, [job_id])
+    assert crud.requeue_stale_jobs(db, stale_after_seconds=900) == (0, [])
+    db.expire_all()
+    assert crud.get_job(db, job_id).status == "running"
+
+
+def test_worker_survives_a_failed_result_write(db, monkeypatch, tmp_path):
+    complete_job = crud.complete_job
+    writes = []
+
+    def flaky_complete_job(session, job_id, result):
+        writes.append(job_id)
+        if len(writes) == 1:
+            raise RuntimeError("db blip")
+        complete_job(session, job_id, result)
+
+    async def handler(job):
+        return {"fileName": job.file_name}
+
+    monkeypatch.setattr(crud, "complete_job", flaky_complete_job)
+    pool = jobs.JobWorkerPool(workers=1)
+    pool.register("echo", handler)
+
+    def submit(name):
+        path = tmp_path / name / "input.txt"
+        path.parent.mkdir()
+        path.write_text(name)
+        job_id = str(uuid.uuid4())
+        crud.create_job(db, job_id, "echo", name, str(path), {})
+        return job_id
+
+    def status(job_id):
+        db.expire_all()
+        return crud.get_job(db, job_id).status
+
+    async def wait_for(job_id, wanted):
+        while status(job_id) != wanted:
+            await asyncio.sleep(0.05)
+
+    async def run():
+        await pool.start()
+        try:
+            first = submit("a")
+            pool.notify()
+            await asyncio.wait_for(wait_for(first, "running"), 10)
+            while pool.active:
+                await asyncio.sleep(0.05)
+            second = submit("b")
+            pool.notify()
+            await asyncio.wait_for(wait_for(second, "succeeded"), 10)
+            assert status(first) == "running"
+            # Once the lost job's lease lapses, recovery puts it back on the queue
+            monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", 0)
+            await pool.recover_stale_jobs()
+            await asyncio.wait_for(wait_for(first, "succeeded"), 10)
+            return first, second
+        finally:
+            await pool.stop()
+
+    first, second = asyncio.run(run())
+    assert writes == [first, second, first]
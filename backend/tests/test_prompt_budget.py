@@ -0,0 +1,56 @@
+import asyncio
+import math
+
+from app import prompt_budget
+from app.backend_pool import BackendPool
+
+
+def test_heuristic_is_the_default_counter():
+    counter = prompt_budget.TokenCounter(None)
+    assert counter.exact is False
+    text = "word " * 701
+    assert counter.count(text) == math.ceil(len(text) / prompt_budget.HEURISTIC_CHARS_PER_TOKEN)
+    assert counter.count("") == 0
+
+
+def test_call_options_pin_num_ctx():
+    pinned = prompt_budget.num_ctx(prompt_budget.SUMMARY_MODEL)
+    short = prompt_budget.call_options("Summarize: hi", 200)
+    long = prompt_budget.call_options("x" * 20000, 200)
+    assert short == {"num_ctx": pinned, "num_predict": 200}
+    assert long == {"num_ctx": pinned, "num_predict": 200}
+
+
+def test_call_options_cap_num_predict_to_the_room_left():
+    pinned = prompt_budget.num_ctx(prompt_budget.SUMMARY_MODEL)
+    prompt = "x" * int((pinned - 100) * prompt_budget.HEURISTIC_CHARS_PER_TOKEN)
+    options = prompt_budget.call_options(prompt, 500)
+    assert options["num_ctx"] == pinned
+    assert options["num_predict"] == pinned - prompt_budget.count_tokens(prompt) - prompt_budget.CONTEXT_SAFETY_TOKENS
+    assert prompt_budget.call_options("x" * pinned * 10, 500)["num_predict"] == 1
+
+
+def test_num_ctx_overrides(monkeypatch):
+    monkeypatch.setattr(prompt_budget, "MODEL_NUM_CTX", {"llava:7b": 4096})
+    assert prompt_budget.num_ctx("llava:7b") == 4096
+    assert prompt_budget.num_ctx("other") == prompt_budget.MODEL_CONTEXT_TOKENS
+
+
+def test_pool_sends_the_pinned_num_ctx(monkeypatch):
+    monkeypatch.setattr(prompt_budget, "MODEL_NUM_CTX", {"llava:7b": 4096})
+    pool = BackendPool(["http://ollama.test:11434"])
+    sent = []
+
+    async def generate(model, prompt, **kwargs):
+        sent.append(kwargs["options"])
+        return {"response": "ok"}
+
+    pool.hosts[0].client.generate = generate
+
+    async def run():
+        await pool.generate("llava:7b", "describe")
+        await pool.generate("llama3.2:3b", "story", options={"num_predict": 50})
+        await pool.aclose()
+
+    asyncio.run(run())
+    assert sent == [{"num_ctx": 4096}, {"num_ctx": prompt_budget.MODEL_CONTEXT_TOKENS, "num_predict": 50}]
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app import embeddings
+from app.routes import summarize
+
+SHORT = "The contract was signed in March. " * 10
+LONG = "The contract was signed in March and renewed every year after that. " * 4000
+QUERY = {"userQuery": "When was it signed?"}
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    """A fresh index store that records every get_or_build call"""
+    index_store = embeddings.EmbeddingIndexStore(root=str(tmp_path))
+    index_store.built = []
+    build = index_store.get_or_build
+
+    async def get_or_build(text):
+        index_store.built.append(embeddings.document_id_for(text))
+        return await build(text)
+
+    monkeypatch.setattr(index_store, "get_or_build", get_or_build)
+    monkeypatch.setattr(summarize, "index_store", index_store)
+    return index_store
+
+
+@pytest.fixture
+def cache_hit(monkeypatch):
+    async def cached(cache_key):
+        return "cached summary"
+
+    monkeypatch.setattr(summarize, "CACHE_ENABLED", True)
+    monkeypatch.setattr(summarize.summary_cache, "get", cached)
+
+
+def test_text_that_fits_is_not_indexed(store):
+    text, _ = asyncio.run(summarize.prepare_llm_text(SHORT, "medium", "paragraph", QUERY["userQuery"]))
+    assert text == SHORT
+    assert asyncio.run(summarize.query_document_id(SHORT, QUERY)) is None
+    assert store.built == []
+
+
+def test_long_text_is_indexed_once_for_a_query(store):
+    text, _ = asyncio.run(summarize.prepare_llm_text(LONG, "medium", "paragraph", QUERY["userQuery"]))
+    assert len(text) < len(LONG)
+    assert asyncio.run(summarize.query_document_id(LONG, QUERY)) == embeddings.document_id_for(LONG)
+    assert store.built == [embeddings.document_id_for(LONG)]
+
+
+def test_long_text_without_a_query_is_not_indexed(store):
+    text, _ = asyncio.run(summarize.prepare_llm_text(LONG, "medium", "paragraph", None))
+    assert text == LONG
+    assert asyncio.run(summarize.query_document_id(LONG, {})) is None
+    assert store.built == []
+
+
+def test_cache_hit_for_short_text_does_not_index(store, cache_hit):
+    summary = asyncio.run(summarize.generate_summary_with_ollama(SHORT, "medium", "paragraph", QUERY["userQuery"]))
+    assert summary == "cached summary"
+    assert asyncio.run(summarize.query_document_id(SHORT, QUERY)) is None
+    assert store.built == []
+
+
+def test_cache_hit_rebuilds_a_missing_index(store, cache_hit):
+    document_id = embeddings.document_id_for(LONG)
+    asyncio.run(summarize.generate_summary_with_ollama(LONG, "medium", "paragraph", QUERY["userQuery"]))
+    assert store.built == []
+    # The summary came from the shared cache, but this replica has no index yet
+    assert asyncio.run(summarize.query_document_id(LONG, QUERY)) == document_id
+    assert store.has(document_id)
+    assert asyncio.run(summarize.query_document_id(LONG, QUERY)) == document_id
+    assert store.built == [document_id]
+    assert asyncio.run(store.load(document_id)).document_id == document_id
+
+
+def test_eviction_drops_expired_then_least_recently_used(tmp_path):
+    store = embeddings.EmbeddingIndexStore(root=str(tmp_path), ttl_seconds=3600, max_documents=2)
+    texts = [f"Document {n}. " * 50 for n in range(4)]
+    ids = [asyncio.run(store.get_or_build(text)).document_id for text in texts]
+    now = time.time()
+    ages = {ids[0]: 7200, ids[1]: 300, ids[2]: 200, ids[3]: 100}
+    for document_id, age in ages.items():
+        os.utime(os.path.join(store.root, document_id), (now - age, now - age))
+
+    assert asyncio.run(store.evict()) == 2
+    assert [store.has(document_id) for document_id in ids] == [False, False, True, True]
+    assert store.evictions == 2
@@ -0,0 +1,28 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from app.routes import summarize
+
+
+def summarize_stage_count() -> float:
+    return REGISTRY.get_sample_value("documind_stage_seconds_count", {"stage": "summarize"}) or 0.0
+
+
+def test_stream_generation_records_the_summarize_stage(monkeypatch):
+    async def generate_stream(model, prompt, **kwargs):
+        for token in ["A short", " summary."]:
+            yield {"response": token}
+
+    monkeypatch.setattr(summarize.backend_pool, "generate_stream", generate_stream)
+    settings = {"length": "short", "style": "paragraph", "compressionRatio": 1.0}
+    parts = []
+
+    async def run():
+        return [event async for event in summarize.stream_generation("a.txt", "Some text to summarize.", settings, parts)]
+
+    before = summarize_stage_count()
+    events = asyncio.run(run())
+    assert "".join(parts) == "A short summary."
+    assert sum(event.startswith("event: token") for event in events) == 2
+    assert summarize_stage_count() == before + 1
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from app import prompt_budget, summarizer
+
+DOCUMENT = "Quarterly revenue grew because cloud sales were strong. " * 2000
+
+
+def test_groups_take_at_least_two_sections():
+    sections = ["x" * 100] * 5
+    assert [len(group) for group in summarizer.group_sections(sections, max_chars=1)] == [2, 2, 1]
+    assert [len(group) for group in summarizer.group_sections(sections, max_chars=1000, fan_in=1)] == [2, 2, 1]
+
+
+def test_window_too_small_for_partial_summaries_is_rejected(monkeypatch):
+    monkeypatch.setattr(prompt_budget, "MODEL_NUM_CTX", {prompt_budget.SUMMARY_MODEL: 1024})
+    calls = []
+
+    async def generate(prompt, options=None):
+        calls.append(prompt)
+        return "summary"
+
+    with pytest.raises(ValueError, match="MODEL_NUM_CTX"):
+        asyncio.run(summarizer.build_final_prompt(DOCUMENT, "long", "paragraph", None, generate))
+    assert calls == []
+
+
+def test_reduce_terminates_when_sections_overrun_the_group_budget(monkeypatch):
+    monkeypatch.setattr(prompt_budget, "MODEL_NUM_CTX", {prompt_budget.SUMMARY_MODEL: 2048})
+    calls = []
+
+    async def generate(prompt, options=None):
+        calls.append(prompt)
+        # Longer than num_predict allows, so no two sections fit one group
+        return "Revenue grew on cloud sales. " * 80
+
+    num_predict = summarizer.PARTIAL_OPTIONS["num_predict"]
+    sections = asyncio.run(summarizer.condense_text(DOCUMENT, generate, 2 * num_predict))
+    assert len(sections) <= 2
+    assert len(calls) < 100
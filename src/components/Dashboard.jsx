@@ -5,7 +5,7 @@ import {
   AlertTriangle, Info, Shield, Copy, Download
 } from 'lucide-react';
 import { validateFiles, generateDefaultSummary } from '../utils/fileValidator';
-import { summarizeFiles } from '../services/apiService';
+import { summarizeFiles, getModelStatus } from '../services/apiService';
 import toast, { Toaster } from 'react-hot-toast';
 
 const Dashboard = ({ onLogout, onHome }) => {
@@ -102,6 +102,16 @@ const Dashboard = ({ onLogout, onHome }) => {
     setIsProcessing(true);
     toast.loading('Generating summary...', { id: 'summarizing' });
 
+    // Warn when the model has to be loaded first; the first summary then takes longer
+    const modelStatus = await getModelStatus('summary');
+    if (modelStatus && !modelStatus.resident) {
+      const expected = modelStatus.expectedLoadMs ? ` (about ${Math.ceil(modelStatus.expectedLoadMs / 1000)}s)` : '';
+      toast(`The AI model is ${modelStatus.warming ? 'still loading' : 'not loaded yet'}${expected}, so this summary may take longer than usual.`, {
+        icon: '⏳',
+        duration: 6000
+      });
+    }
+
     try {
       const settings = {
         length: summaryLength,
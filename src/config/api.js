@@ -11,9 +11,11 @@ export const API_ENDPOINTS = {
   
   // Summarization
   SUMMARIZE: `${API_BASE_URL}/summarize/summarize`,
+  SUMMARY_MODEL_STATUS: `${API_BASE_URL}/summarize/model-status`,
   
   // Image analysis
   ANALYZE_IMAGE: `${API_BASE_URL}/image/analyze-image`,
+  IMAGE_MODEL_STATUS: `${API_BASE_URL}/image/model-status`,
 };
 
 export default API_BASE_URL;
\ No newline at end of file
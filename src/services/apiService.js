@@ -183,4 +183,19 @@ export const analyzeImage = async (imageFile, generateStory = false, storyPrompt
   }
   
   return response.json();
-};
\ No newline at end of file
+};
+
+// Model status: whether the model is loaded, so the UI can warn about a slow first request
+export const getModelStatus = async (kind = 'summary') => {
+  const endpoint = kind === 'image' ? API_ENDPOINTS.IMAGE_MODEL_STATUS : API_ENDPOINTS.SUMMARY_MODEL_STATUS;
+  try {
+    const response = await fetch(endpoint);
+    if (!response.ok) {
+      return null;
+    }
+    return response.json();
+  } catch (error) {
+    // The status is advisory; never block a request on it
+    return null;
+  }
+};